@@ -19,16 +19,8 @@ import mysql.connector
 import matplotlib.pyplot as plt
 import pandas as pd
 from wordcloud import WordCloud
-import nltk
-from nltk.corpus import stopwords
 import matplotlib.dates as mdates
 
-# Check if stopwords are already downloaded; if not, download them
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords', quiet=True)
-
 # Database configuration using Streamlit secrets
 DB_CONFIG = {
     "host": st.secrets["db_host"],
@@ -108,6 +100,27 @@ def fetch_articles_filtered(start_date, end_date, category, search_query, sort_o
         articles = cursor.fetchall()
     return articles
 
+def collapse_stories(articles):
+    """
+    Keeps only the first article of each story (near-duplicates share a story_id).
+
+    Args:
+        articles (list): Article rows from the database, in display order.
+
+    Returns:
+        list: The articles with later copies of an already shown story removed.
+    """
+    shown_stories = set()
+    collapsed = []
+    for row in articles:
+        story_id = row.get("story_id")
+        if story_id is not None:
+            if story_id in shown_stories:
+                continue
+            shown_stories.add(story_id)
+        collapsed.append(row)
+    return collapsed
+
 def fetch_category_counts(start_date, end_date):
     """
     Retrieves the count of articles per category within the specified date range.
@@ -328,8 +341,11 @@ def main():
         end_date = st.sidebar.date_input(f"📅 Till och med: (Nyaste: {latest_date})", latest_date)
         search_query = st.sidebar.text_input("🔍 Sök efter artiklar")
         sort_option = st.sidebar.radio("Sortera efter:", ["Nyast först", "Äldst först"])
+        collapse_duplicates = st.sidebar.checkbox("🧩 Visa samma nyhet från flera källor en gång", value=True)
 
         articles = fetch_articles_filtered(start_date, end_date, selected_category, search_query, sort_option)
+        if collapse_duplicates:
+            articles = collapse_stories(articles)
         total_articles = len(articles)
         st.subheader(f"# Totalt antal artiklar efter filtrering: {total_articles}")
 
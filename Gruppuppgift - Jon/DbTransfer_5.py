@@ -3,7 +3,7 @@ DbTransfer_5.py
 
 This script transfers the classified and validated news articles to a MySQL database.
 It:
-  - Imports the structured data (`validDict`) from MLModelReturns_4.py
+  - Takes the structured data (`validDict`) from MLModelReturns_4.py
   - Establishes a connection to a MySQL database
   - Inserts only new articles into the `news` table, ensuring no duplicates using SQL constraints
   - Updates the `category_counts` table with the number of articles per category
@@ -11,8 +11,6 @@ It:
 
 import json
 import mysql.connector
-import MLModelReturns_4
-validDict = MLModelReturns_4.main()
 
 # Database configuration - Update credentials as needed
 DB_CONFIG = {
@@ -37,22 +35,27 @@ def db_connection():
 def insert_data(data, cnxn):
     """
     Inserts classified articles into the `news` table, avoiding duplicates using SQL's ON DUPLICATE KEY UPDATE.
+
+    Returns:
+        bool: True if the articles were committed, False on a database error.
     """
     cursor = cnxn.cursor()
     sql = """
-    INSERT INTO news (title, summary, link, published, topic)
-    VALUES (%s, %s, %s, %s, %s)
-    ON DUPLICATE KEY UPDATE title = VALUES(title), summary = VALUES(summary), published = VALUES(published), topic = VALUES(topic);
+    INSERT INTO news (title, summary, link, published, topic, story_id)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE title = VALUES(title), summary = VALUES(summary), published = VALUES(published), topic = VALUES(topic), story_id = VALUES(story_id);
     """
     
-    values = [(d["title"], d["summary"], d["link"], d["published"], json.dumps(d["categories"])) for d in data]
+    values = [(a.title, a.summary, a.link, a.published, json.dumps(list(a.categories)), a.story_id) for a in data]
     
     try:
         cursor.executemany(sql, values)
         cnxn.commit()
         print(f"{cursor.rowcount} articles processed (newly inserted or updated in the database).")
+        return True
     except mysql.connector.Error as err:
         print(f"Error inserting data: {err}")
+        return False
     finally:
         cursor.close()
 
@@ -80,18 +83,30 @@ def calculate_category_counts(cnxn):
     cnxn.commit()
     cursor.close()
 
-def main():
+def main(validDict=None):
     """
     Main function to connect to the database, insert or update news articles, and update category counts.
+
+    Args:
+        validDict (list): Classified articles from MLModelReturns_4.main(). If None, they are fetched and classified.
+
+    Returns:
+        bool: True if the articles were committed to the database.
     """
+    if validDict is None:
+        import MLModelReturns_4
+        validDict = MLModelReturns_4.main()
+
     cnxn = db_connection()
     if cnxn:
-        insert_data(validDict, cnxn)  # Insert or update news articles in the database
+        inserted = insert_data(validDict, cnxn)  # Insert or update news articles in the database
         calculate_category_counts(cnxn)  # Update category counts
         cnxn.close()
         print("Database connection closed.")
+        return inserted
     else:
         print("No database connection established.")
+        return False
 
 if __name__ == "__main__":
     main()
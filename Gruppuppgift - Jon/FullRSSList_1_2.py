@@ -2,14 +2,40 @@
 FullRSSList_1_2.py
 
 This script processes articles (posts) from RssArticles_1.py.
-It extracts key fields (title, summary, link, and published),
-formats dates into a consistent format, and returns a structured final list.
+It extracts key fields (title, summary, link, and published) into a columnar
+ArticleBatch, formats dates into a consistent format, and returns a structured
+final list of Article records (see article.py).
 
+Publish dates are normalized for a whole batch at once. The date tuples that
+feedparser has already parsed are used when they exist, and are converted to
+'YYYY-MM-DD HH:MM:SS' strings with NumPy in one vectorized step. Entries
+without a parsed date fall back to strptime, trying first the format that last
+worked for the same feed.
+
+Nothing is fetched when the module is imported; build_final_list() processes
+the posts it is given.
 """
 
-# Import posts from RssArticles_1
-from RssArticles_1 import posts
 import datetime
+import re
+
+import numpy as np
+
+from article import Article, ArticleBatch
+
+# Date formats tried for entries that feedparser could not parse
+DATE_FORMATS = [
+    "%a, %d %b %Y %H:%M:%S %z",  # Example: Mon, 01 Jan 2024 12:30:00 +0000
+    "%a, %d %b %Y %H:%M:%S %Z",  # Example: Mon, 01 Jan 2024 12:30:00 GMT
+    "%a, %d %b %Y %H:%M:%S"      # Example: Mon, 01 Jan 2024 12:30:00
+]
+FALLBACK_DATE = "1970-01-01 00:00:00"
+
+# Trailing UTC offset of a date string, e.g. '+0100' or '+01:00'
+_UTC_OFFSET_PATTERN = re.compile(r"([+-])(\d{2}):?(\d{2})\s*$")
+
+# Feed host -> index in DATE_FORMATS of the format that last parsed one of its dates
+_feed_date_formats = {}
 
 def extract_rss_fields(posts):
     """
@@ -20,70 +46,129 @@ def extract_rss_fields(posts):
         posts (list): List of RSS feed entries.
 
     Returns:
-        list: A list of dictionaries with extracted fields.
+        ArticleBatch: The extracted fields, one list per field.
+    """
+    return ArticleBatch.from_posts(posts)
+
+
+def _utc_offset_seconds(published):
+    """
+    Returns the UTC offset written at the end of a date string, in seconds (0 if there is none).
+    """
+    match = _UTC_OFFSET_PATTERN.search(published)
+    if not match:
+        return 0
+    sign, hours, minutes = match.groups()
+    seconds = int(hours) * 3600 + int(minutes) * 60
+    return -seconds if sign == "-" else seconds
+
+
+def _feed_host(link):
+    """
+    Returns the host part of an article link, used to tell feeds apart.
+    """
+    return link.partition("//")[2].partition("/")[0]
+
+
+def _parse_date_string(published, feed):
+    """
+    Parses a date string with strptime, trying first the format that last worked for the feed.
+
+    Returns:
+        str: The date as 'YYYY-MM-DD HH:MM:SS', or FALLBACK_DATE if no format matches.
+    """
+    remembered = _feed_date_formats.get(feed)
+    order = range(len(DATE_FORMATS))
+    if remembered is not None:
+        order = [remembered] + [i for i in order if i != remembered]
+    for i in order:
+        try:
+            parsed_date = datetime.datetime.strptime(published, DATE_FORMATS[i])
+        except ValueError:
+            continue
+        _feed_date_formats[feed] = i
+        return parsed_date.strftime("%Y-%m-%d %H:%M:%S")
+    return FALLBACK_DATE
+
+
+def _format_date_tuples(date_tuples, offsets):
+    """
+    Converts UTC date tuples plus UTC offsets (seconds) to 'YYYY-MM-DD HH:MM:SS' strings in one vectorized step.
+    """
+    fields = np.array([date_tuple[:6] for date_tuple in date_tuples], dtype=np.int64).reshape(-1, 6)
+    months = (fields[:, 0] - 1970) * 12 + fields[:, 1] - 1
+    days = months.astype("datetime64[M]").astype("datetime64[D]") + (fields[:, 2] - 1)
+    seconds = fields[:, 3] * 3600 + fields[:, 4] * 60 + fields[:, 5] + np.asarray(offsets, dtype=np.int64)
+    timestamps = days.astype("datetime64[s]") + seconds
+    return [text.replace("T", " ") for text in np.datetime_as_string(timestamps, unit="s").tolist()]
+
+
+def normalize_published_dates(batch):
+    """
+    Normalizes the 'published' column of a batch of extracted RSS items.
+
+    The result keeps the local time written in the feed, as strptime with %z does:
+    feedparser's UTC tuple is shifted back by the offset found in the date string.
+
+    Args:
+        batch (ArticleBatch): The extracted RSS fields.
+
+    Returns:
+        list: One 'YYYY-MM-DD HH:MM:SS' string per item (FALLBACK_DATE if the date could not be parsed).
     """
-    extracted_items = []
-    
-    for post in posts:
-        extracted_items.append({
-            "title": post.get("title", ""),
-            "summary": post.get("summary", ""),
-            "link": post.get("link", ""),
-            "published": post.get("published", "")
-        })
+    published_strs = [FALLBACK_DATE] * len(batch)
+    tuple_positions, date_tuples, offsets = [], [], []
 
-    return extracted_items
+    for position, (published, date_tuple) in enumerate(zip(batch.published, batch.published_parsed)):
+        published = published or ""
+        if date_tuple:
+            tuple_positions.append(position)
+            date_tuples.append(date_tuple)
+            offsets.append(_utc_offset_seconds(published))
+        elif published:
+            published_strs[position] = _parse_date_string(published, _feed_host(batch.links[position] or ""))
 
+    if date_tuples:
+        for position, published_str in zip(tuple_positions, _format_date_tuples(date_tuples, offsets)):
+            published_strs[position] = published_str
+    return published_strs
 
-def format_rss_data(items):
+
+def format_rss_data(batch):
     """
-    Converts extracted RSS data into a structured 2D list.
+    Converts extracted RSS data into a list of Article records.
     Ensures 'published' field is formatted as 'YYYY-MM-DD HH:MM:SS'.
 
     Args:
-        items (list): List of dictionaries containing extracted RSS fields.
+        batch (ArticleBatch): The extracted RSS fields.
+
+    Returns:
+        list: A list of Article records with formatted RSS data.
+    """
+    published_strs = normalize_published_dates(batch)
+    return list(map(Article, batch.titles, batch.summaries, batch.links, published_strs))
+
+
+def build_final_list(posts):
+    """
+    Processes RSS posts into the final list of Article records (title, summary, link, published).
+
+    Args:
+        posts (list): List of RSS feed entries.
 
     Returns:
-        list: A list of lists with formatted RSS data.
-    """
-    
-    date_formats = [
-        "%a, %d %b %Y %H:%M:%S %z",  # Example: Mon, 01 Jan 2024 12:30:00 +0000
-        "%a, %d %b %Y %H:%M:%S %Z",  # Example: Mon, 01 Jan 2024 12:30:00 GMT
-        "%a, %d %b %Y %H:%M:%S"      # Example: Mon, 01 Jan 2024 12:30:00
-    ]
-    
-    formatted_list = []
-    
-    for item in items:
-        title = item["title"]
-        summary = item["summary"]
-        link = item["link"]
-        published = item["published"]
-        
-        # Try to parse date using different formats
-        parsed_date = None
-        for fmt in date_formats:
-            try:
-                parsed_date = datetime.datetime.strptime(published, fmt)
-                break
-            except ValueError:
-                continue
-        
-        # If parsing fails, set default timestamp
-        if not parsed_date:
-            parsed_date = datetime.datetime(1970, 1, 1)  # Fallback date
-        
-        published_str = parsed_date.strftime("%Y-%m-%d %H:%M:%S")
-        
-        formatted_list.append([title, summary, link, published_str])
-    
-    return formatted_list
-
-# Process RSS posts
-extracted_posts = extract_rss_fields(posts)
-MyTheFinalList = format_rss_data(extracted_posts)
-
-# Print results
-print(MyTheFinalList)
-print(f"Total articles processed: {len(MyTheFinalList)}")
\ No newline at end of file
+        list: A list of Article records with formatted RSS data.
+    """
+    extracted_posts = extract_rss_fields(posts)
+    return format_rss_data(extracted_posts)
+
+
+if __name__ == "__main__":
+    from RssArticles_1 import RSS_URLS, fetch_rss_feeds
+
+    # Process RSS posts
+    MyTheFinalList = build_final_list(fetch_rss_feeds(RSS_URLS))
+
+    # Print results
+    print(MyTheFinalList)
+    print(f"Total articles processed: {len(MyTheFinalList)}")
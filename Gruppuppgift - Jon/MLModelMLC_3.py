@@ -4,127 +4,551 @@ MLModelMLC_3.py
 This script trains a multi-label text classification model using data from Book1_2.csv.
 It:
   - Loads and preprocesses the data
-  - Trains an SVC-based OneVsRest model with GridSearchCV (if not cached)
-  - Caches both the fitted vectorizer and the trained model to save time on subsequent runs
+  - Trains an SVC-based OneVsRest model with GridSearchCV, or a linear one (see linear_engine.py), if not cached
+  - Fits and applies the TF-IDF vectorizer on all CPU cores (see parallel_tfidf.py)
+  - Divides the CPU cores between search workers, per-category estimators and BLAS
+    threads during training (see parallelism.py)
+  - Prunes the vocabulary to the features selected per label (see feature_selection.py)
+  - Caches the fitted vectorizer, the vectorized matrices (see feature_cache.py) and the
+    trained model to save time on subsequent runs;
+    the preprocessing is saved as an artifact that loads without NLTK
   - Prints out the best model parameters and test accuracy
-  - Exposes key variables for import into other scripts:
-       categories, x_train, vectorizer, best_clf_pipeline
+  - Publishes every trained model as a version in the model registry (see model_registry.py);
+    a model is only retrained when the data, the code or the configuration changed
+  - Exposes load_model() for other scripts, which returns:
+       categories, vectorizer, best_clf_pipeline
+
+Nothing is loaded or trained when the module is imported; call load_model() or main().
 """
 
 import os
-import joblib
-import re
 import sys
+import time
 import warnings
-import nltk
+import joblib
 import pandas as pd
-import numpy as np
-from nltk.corpus import stopwords
-from nltk.stem.snowball import SnowballStemmer
 from sklearn.model_selection import train_test_split, GridSearchCV
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.pipeline import Pipeline
 from sklearn.multiclass import OneVsRestClassifier
 from sklearn.metrics import accuracy_score
 from sklearn.svm import SVC
-from tokenizer_utils import custom_tokenizer
+import feature_cache
+import model_registry
+import parallel_tfidf
+import parallelism
+import preprocessing
 
 # Suppress warnings for clarity
 if not sys.warnoptions:
     warnings.simplefilter("ignore")
 
-# Ensure that stopwords are downloaded
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords', quiet=True)
+# Path to the dataset
+DATA_PATH = "C:\\workspace\\ML\\ML-grupp6\\Gruppuppgift\\Book1_2.csv"
 
-# Initialize Swedish stopwords and stemmer
-stop_words = set(stopwords.words('swedish'))
-stemmer = SnowballStemmer("swedish")
+# Define file paths for caching the vectorizer and model
+VECTORIZER_PATH = "vectorizer.pkl"  # Path to save/load the fitted vectorizer
+MODEL_PATH = "best_clf_pipeline.pkl"  # Path to save/load the trained model
 
-# Load the dataset
-DATA_PATH = "C:\\workspace\\ML\\ML-grupp6\\Gruppuppgift\\Book1_2.csv"
-data_raw = pd.read_csv(DATA_PATH)
-data_raw = data_raw.sample(frac=1)  # Shuffle the data
+# Shuffle and split of the dataset; fixed, so cached feature matrices stay valid
+SHUFFLE_SEED = 42
+SPLIT_SEED = 42
+TEST_SIZE = 0.30
 
-# Extract categories (excluding 'Id' and 'Heading')
-categories = list(data_raw.columns[2:])
+# Feature backend: "tfidf" (vocabulary of every n-gram) or "hashing" (fixed number of
+# hash columns with streaming IDF, see feature_backends.py)
+FEATURE_BACKEND = "tfidf"
+HASHING_N_FEATURES = 2 ** 20  # Hash columns of the hashing backend
+HASHING_USE_IDF = True        # IDF reweighting in the hashing backend
 
-# Replace NaN with 0
-data_raw.fillna(0, inplace=True)
+# Vocabulary pruning and feature selection of the TF-IDF backend (see feature_selection.py).
+# Sweep on Book1_2.csv (accuracy / micro F1 / vectorizer size): all features 0.427 / 0.603 / 821 KB,
+# 10000 per label 0.428 / 0.601 / 770 KB, 5000 0.421 / 0.598 / 695 KB, 2000 0.423 / 0.595 / 411 KB.
+# Every budget costs some F1, so selection is off by default; 2000 halves the vectorizer and
+# cuts predict_proba time by about a quarter where that matters more.
+# min_df=2 lost about 7 points, so it stays at 1 until the training corpus is larger.
+MIN_DF = 1                 # Drop n-grams found in fewer documents than this
+MAX_DF = 1.0               # Drop n-grams found in more than this fraction of documents
+SELECT_K_PER_LABEL = None  # Features kept per label by chi² selection; None keeps all
 
-# Split the dataset into training and testing sets
-train, test = train_test_split(data_raw, random_state=42, test_size=0.30, shuffle=True)
-x_train_text = train['Heading']
-x_test_text = test['Heading']
+# Training engine: "svc" (GridSearchCV over OneVsRest SVC with probability=True) or
+# "linear" (per-category logistic regression with warm starts over the C grid,
+# see linear_engine.py). On Book1_2.csv the linear engine trained in 70 s on one core
+# with a test accuracy of 0.369; the svc engine reaches 0.394, so it stays the default
+TRAINING_ENGINE = "svc"
 
-y_train = train.drop(labels=['Id', 'Heading'], axis=1)
-y_test = test.drop(labels=['Id', 'Heading'], axis=1)
+# Parameter grid for the search; gamma only affects the rbf kernel, so it is only
+# searched there (20 candidates instead of 32, with the same results)
+param_grid = [
+    {
+        'clf__estimator__C': [0.1, 1, 10, 100],
+        'clf__estimator__kernel': ['linear'],
+    },
+    {
+        'clf__estimator__C': [0.1, 1, 10, 100],
+        'clf__estimator__kernel': ['rbf'],
+        'clf__estimator__gamma': [0.0001, 0.001, 0.01, 0.1],
+    },
+]
+
+# Search mode: "grid" (every candidate on every fold of all training data) or "halving"
+# (successive halving: all candidates start on a small sample, and only the best
+# 1/HALVING_FACTOR continue to the next round on HALVING_FACTOR times as many samples)
+SEARCH_MODE = "grid"
+HALVING_FACTOR = 3
+HALVING_MIN_RESOURCES = 150   # Training headlines per candidate in the first round
+HALVING_MAX_RESOURCES = None  # Compute budget: at most this many headlines per candidate (None: all)
+HALVING_CV = 5
+
+# Search over raw texts with the vectorizer inside the pipeline, so it is fitted on the
+# training part of every fold only (no leakage into the validation part). The fitted
+# vectorizer of each fold is memoized in PIPELINE_CACHE_DIR (Pipeline(memory=...)), so
+# every fold is tokenized and vectorized once, not once per candidate.
+# Feature selection (SELECT_K_PER_LABEL) is not used in this mode.
+SEARCH_ON_TEXT = False
+PIPELINE_CACHE_DIR = "pipeline_cache"
+
+# Parallelism of the training (see parallelism.py): the cores used, divided between the
+# search worker processes, the per-category estimators within a worker and the BLAS
+# threads within a worker. None lets parallelism.plan() fill in a level; explicit values
+# must multiply to at most TRAINING_CORES. bench_parallelism.py times different splits.
+TRAINING_CORES = None  # None: every core
+SEARCH_JOBS = None
+LABEL_JOBS = None
+BLAS_THREADS = None
+
+# How load_model() reads the pickled vectorizer and model. "r" memory-maps their NumPy
+# arrays (support vectors or coefficients, IDF weights) read-only from the uncompressed
+# pickles, so every process that serves the model shares one copy in the file cache;
+# None reads a private copy. The vocabulary dict of the vectorizer is always private;
+# a compiled model (see linear_scorer.py) shares that too.
+MMAP_MODE = "r"
+
+# Source files whose changes make a new model version (see model_registry.py)
+CODE_PATHS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name) for name in (
+    "MLModelMLC_3.py", "tokenizer_utils.py", "preprocessing.py", "parallel_tfidf.py",
+    "feature_backends.py", "feature_selection.py", "linear_engine.py")]
+# Source files whose changes change the fitted vectorizer (see feature_cache.py)
+FEATURE_CODE_PATHS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name) for name in (
+    "tokenizer_utils.py", "preprocessing.py", "parallel_tfidf.py", "feature_backends.py",
+    "feature_selection.py")]
+
+# Loaded (categories, vectorizer, best_clf_pipeline), filled in by load_model()
+_model = None
+# The registry version this process serves ("" without a registry), filled in by served_version()
+_served_version = None
+
+
+def load_dataset(path=None):
+    """
+    Loads the annotated dataset (DATA_PATH by default), shuffles it, and replaces NaN with 0.
+    """
+    data_raw = pd.read_csv(path or DATA_PATH)
+    data_raw = data_raw.sample(frac=1, random_state=SHUFFLE_SEED)  # Shuffle the data
+    data_raw.fillna(0, inplace=True)
+    return data_raw
+
+
+def load_categories(path=None):
+    """
+    Reads the category names (all columns except 'Id' and 'Heading') from the dataset header.
+    """
+    return list(pd.read_csv(path or DATA_PATH, nrows=0).columns[2:])
 
-# Define file paths for caching the vectorizer and model
-VECTORIZER_PATH = "vectorizer.pkl"  # Path to save/load the fitted vectorizer
-MODEL_PATH = "best_clf_pipeline.pkl"  # Path to save/load the trained model
 
-# Caching for the vectorizer:
-# If the cached vectorizer exists, load it; otherwise, create, fit, and save it.
-if os.path.exists(VECTORIZER_PATH):
-    vectorizer = joblib.load(VECTORIZER_PATH)
-    print("Vectorizer loaded from disk.")
-else:
-    vectorizer = TfidfVectorizer(
+def split_dataset(data_raw):
+    """
+    Splits the dataset into training and testing texts and label frames.
+
+    Returns:
+        tuple: x_train_text, x_test_text, y_train, y_test
+    """
+    train, test = train_test_split(data_raw, random_state=SPLIT_SEED, test_size=TEST_SIZE, shuffle=True)
+    x_train_text = train['Heading']
+    x_test_text = test['Heading']
+
+    y_train = train.drop(labels=['Id', 'Heading'], axis=1)
+    y_test = test.drop(labels=['Id', 'Heading'], axis=1)
+    return x_train_text, x_test_text, y_train, y_test
+
+
+def build_vectorizer():
+    """
+    Creates the (unfitted) vectorizer of the configured FEATURE_BACKEND.
+    """
+    from tokenizer_utils import custom_tokenizer  # Imports NLTK; only needed for fitting
+    if FEATURE_BACKEND == "hashing":
+        from feature_backends import HashingTfidfVectorizer
+        return HashingTfidfVectorizer(custom_tokenizer, n_features=HASHING_N_FEATURES,
+                                      ngram_range=(1, 3), use_idf=HASHING_USE_IDF)
+    if FEATURE_BACKEND != "tfidf":
+        raise ValueError(f"Unknown FEATURE_BACKEND: {FEATURE_BACKEND!r}")
+    return TfidfVectorizer(
         tokenizer=custom_tokenizer,  # Custom tokenizer for preprocessing
         preprocessor=None,           # Disable built-in preprocessing as it's handled in the tokenizer
         lowercase=False,             # Already lowercased in the tokenizer
         analyzer='word',
         ngram_range=(1, 3),
+        min_df=MIN_DF,
+        max_df=MAX_DF,
         norm='l2'
     )
-    vectorizer.fit(x_train_text)
+
+
+def fit_vectorizer(x_train_text, y_train=None):
+    """
+    Caching for the vectorizer:
+    If the cached vectorizer exists, load it; otherwise, create, fit, and save it.
+    With training labels, the TF-IDF vocabulary is reduced to SELECT_K_PER_LABEL
+    features per label. The saved vectorizer tokenizes with the preprocessing
+    artifact (see preprocessing.py), so loading it does not import NLTK.
+
+    Returns:
+        tuple: The vectorizer, and the training matrix if the vectorizer was fitted here
+            (the texts are tokenized once for fitting, selection and the matrix), else None.
+    """
+    if os.path.exists(VECTORIZER_PATH):
+        vectorizer = joblib.load(VECTORIZER_PATH)
+        print("Vectorizer loaded from disk.")
+        return vectorizer, None
+
+    vectorizer = build_vectorizer()
+    x_train = parallel_tfidf.fit_transform(vectorizer, x_train_text)
+    if y_train is not None and SELECT_K_PER_LABEL and isinstance(vectorizer, TfidfVectorizer):
+        from feature_selection import select_features
+        vectorizer, x_train = select_features(vectorizer, x_train, y_train, SELECT_K_PER_LABEL)
+    vectorizer.tokenizer = preprocessing.save_artifact(x_train_text)
     joblib.dump(vectorizer, VECTORIZER_PATH)
     print("Vectorizer fitted and saved to disk.")
+    return vectorizer, x_train
+
+
+def parallelism_plan():
+    """
+    The division of the training cores configured by TRAINING_CORES, SEARCH_JOBS, LABEL_JOBS and BLAS_THREADS.
+    """
+    return parallelism.plan(TRAINING_CORES, SEARCH_JOBS, LABEL_JOBS, BLAS_THREADS)
 
-# Transform training and testing texts using the (cached or newly fitted) vectorizer
-x_train = vectorizer.transform(x_train_text)
-x_test = vectorizer.transform(x_test_text)
-
-# Define the SVC model inside a pipeline with OneVsRestClassifier
-svc_pipeline = Pipeline([
-    ('clf', OneVsRestClassifier(SVC(probability=True)))
-])
-
-# Parameter grid for GridSearchCV
-param_grid = {
-    'clf__estimator__C': [0.1, 1, 10, 100],
-    'clf__estimator__kernel': ['linear', 'rbf'],
-    'clf__estimator__gamma': [0.0001, 0.001, 0.01, 0.1]
-}
-
-# Caching for the model:
-# If the cached model exists, load it; otherwise, perform GridSearchCV and save the trained model.
-if os.path.exists(MODEL_PATH):
-    best_clf_pipeline = joblib.load(MODEL_PATH)
-    print("Model pipeline loaded from disk.")
-else:
-    grid = GridSearchCV(svc_pipeline, param_grid, cv=10, scoring='accuracy', n_jobs=-1)
-    grid.fit(x_train, y_train)
+
+def build_classifier(label_jobs=None):
+    """
+    The OneVsRest SVC searched by the svc engine, fitting label_jobs categories at a time.
+    """
+    return OneVsRestClassifier(SVC(probability=True), n_jobs=label_jobs)
+
+
+def build_search(pipeline, n_samples, search_jobs=None):
+    """
+    Creates the hyperparameter search of the configured SEARCH_MODE over param_grid,
+    run by search_jobs worker processes (None: every core).
+    """
+    n_jobs = search_jobs or -1
+    if SEARCH_MODE == "halving":
+        from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+        from sklearn.model_selection import HalvingGridSearchCV
+        max_resources = min(HALVING_MAX_RESOURCES or n_samples, n_samples)
+        return HalvingGridSearchCV(pipeline, param_grid, factor=HALVING_FACTOR, resource='n_samples',
+                                   min_resources=min(HALVING_MIN_RESOURCES, max_resources),
+                                   max_resources=max_resources, cv=HALVING_CV, scoring='accuracy',
+                                   n_jobs=n_jobs, random_state=SPLIT_SEED)
+    if SEARCH_MODE != "grid":
+        raise ValueError(f"Unknown SEARCH_MODE: {SEARCH_MODE!r}")
+    return GridSearchCV(pipeline, param_grid, cv=10, scoring='accuracy', n_jobs=n_jobs)
+
+
+def train_model(x_train, y_train):
+    """
+    Caching for the model:
+    If the cached model exists, load it; otherwise, search the hyperparameters (see SEARCH_MODE)
+    and save the trained model.
+    """
+    if os.path.exists(MODEL_PATH):
+        best_clf_pipeline = joblib.load(MODEL_PATH)
+        print("Model pipeline loaded from disk.")
+        return best_clf_pipeline
+
+    plan = parallelism_plan()
+    print("Parallelism:", plan)
+    if TRAINING_ENGINE == "linear":
+        from linear_engine import train_linear_model
+        with parallelism.limits(plan["blas_threads"]):
+            best_clf_pipeline, best_params, best_score = train_linear_model(
+                x_train, y_train, n_jobs=plan["search_jobs"] * plan["label_jobs"])
+        joblib.dump(best_clf_pipeline, MODEL_PATH)
+        print("Model trained and saved to disk.")
+        print("Best parameters:", best_params)
+        print("Best cross-validation score:", best_score)
+        return best_clf_pipeline
+    if TRAINING_ENGINE != "svc":
+        raise ValueError(f"Unknown TRAINING_ENGINE: {TRAINING_ENGINE!r}")
+
+    # Define the SVC model inside a pipeline with OneVsRestClassifier
+    svc_pipeline = Pipeline([
+        ('clf', build_classifier(plan["label_jobs"]))
+    ])
+    grid = build_search(svc_pipeline, x_train.shape[0], plan["search_jobs"])
+    start = time.perf_counter()
+    with parallelism.limits(plan["blas_threads"]):
+        grid.fit(x_train, y_train)
+    search_time = time.perf_counter() - start
     best_clf_pipeline = grid.best_estimator_
     joblib.dump(best_clf_pipeline, MODEL_PATH)
     print("Model trained and saved to disk.")
+    print(f"Search ({SEARCH_MODE}): {len(grid.cv_results_['params'])} candidate evaluations in {search_time:.1f} s")
+    if SEARCH_MODE == "halving":
+        for iteration, (n_candidates, n_resources) in enumerate(zip(grid.n_candidates_, grid.n_resources_)):
+            print(f"  Round {iteration}: {n_candidates} candidates on {n_resources} headlines")
     print("Best parameters:", grid.best_params_)
     print("Best cross-validation score:", grid.best_score_)
+    return best_clf_pipeline
+
+
+def feature_settings():
+    """
+    The settings that decide the fitted vectorizer and the feature matrices, as keyed in the feature cache.
+    """
+    vectorizer = build_vectorizer()
+    params = vectorizer.get_params()
+    tokenizer = params.pop("tokenizer")
+    return {
+        "vectorizer": type(vectorizer).__name__,
+        "params": params,
+        "tokenizer": f"{tokenizer.__module__}.{tokenizer.__qualname__}",
+        "select_k_per_label": SELECT_K_PER_LABEL,
+        "shuffle_seed": SHUFFLE_SEED,
+        "split_seed": SPLIT_SEED,
+        "test_size": TEST_SIZE,
+    }
+
+
+def vectorize_dataset(data_raw, data_path=None):
+    """
+    Splits the dataset, fits (or loads) the vectorizer and returns the feature matrices.
+
+    The vectorizer and the matrices come from the feature cache (see feature_cache.py)
+    when the dataset file, the vectorizer settings, the split and the feature code are
+    unchanged, so nothing is tokenized; otherwise the vectorizer is fitted, the texts
+    are vectorized and the result is cached.
+
+    Returns:
+        tuple: vectorizer, x_train, x_test, y_train, y_test
+    """
+    x_train_text, x_test_text, y_train, y_test = split_dataset(data_raw)
+    key = feature_cache.feature_key(data_path or DATA_PATH, feature_settings(), FEATURE_CODE_PATHS)
+    vectorizer_files = {model_registry.VECTORIZER_FILE: VECTORIZER_PATH,
+                        model_registry.PREPROCESSING_FILE: preprocessing.PREPROCESSING_PATH}
+    features = feature_cache.load_features(key)
+    if features is not None and feature_cache.restore_files(key, vectorizer_files):
+        vectorizer = joblib.load(VECTORIZER_PATH)
+        print("Vectorizer and feature matrices loaded from cache.")
+        return vectorizer, features["x_train"], features["x_test"], features["y_train"], features["y_test"]
+
+    vectorizer, x_train = fit_vectorizer(x_train_text, y_train)
+
+    # Transform training and testing texts using the (cached or newly fitted) vectorizer
+    if x_train is None:
+        x_train = parallel_tfidf.transform(vectorizer, x_train_text)
+    x_test = parallel_tfidf.transform(vectorizer, x_test_text)
+    feature_cache.save_features(key, x_train, x_test, y_train, y_test, files=vectorizer_files)
+    print("Feature matrices vectorized and cached.")
+    return vectorizer, x_train, x_test, y_train, y_test
+
+
+def train_text_model(x_train_text, y_train):
+    """
+    Searches the hyperparameters with the vectorizer inside the pipeline (see SEARCH_ON_TEXT).
+
+    If the cached vectorizer and model exist, they are loaded instead.
+
+    Returns:
+        tuple: vectorizer, best_clf_pipeline
+    """
+    if os.path.exists(VECTORIZER_PATH) and os.path.exists(MODEL_PATH):
+        print("Vectorizer and model pipeline loaded from disk.")
+        return joblib.load(VECTORIZER_PATH), joblib.load(MODEL_PATH)
+
+    plan = parallelism_plan()
+    print("Parallelism:", plan)
+    memory = joblib.Memory(PIPELINE_CACHE_DIR, verbose=0)
+    text_pipeline = Pipeline([
+        ('tfidf', build_vectorizer()),
+        ('clf', build_classifier(plan["label_jobs"]))
+    ], memory=memory)
+    grid = build_search(text_pipeline, len(x_train_text), plan["search_jobs"])
+    start = time.perf_counter()
+    with parallelism.limits(plan["blas_threads"]):
+        grid.fit(list(x_train_text), y_train)
+    print(f"Search ({SEARCH_MODE}, on text): {len(grid.cv_results_['params'])} candidate evaluations "
+          f"in {time.perf_counter() - start:.1f} s")
+    # Fold results are only useful within one search
+    memory.clear(warn=False)
+
+    vectorizer = grid.best_estimator_.named_steps['tfidf']
+    vectorizer.tokenizer = preprocessing.save_artifact(x_train_text)
+    best_clf_pipeline = Pipeline([('clf', grid.best_estimator_.named_steps['clf'])])
+    joblib.dump(vectorizer, VECTORIZER_PATH)
+    joblib.dump(best_clf_pipeline, MODEL_PATH)
+    print("Model trained and saved to disk.")
+    print("Best parameters:", grid.best_params_)
+    print("Best cross-validation score:", grid.best_score_)
+    return vectorizer, best_clf_pipeline
+
+
+def train(metrics=None):
+    """
+    Loads the data, fits (or loads) the vectorizer and the model, and evaluates the model on test data.
+
+    Args:
+        metrics (dict): If given, the test metrics are stored in it.
+
+    Returns:
+        tuple: categories, vectorizer, best_clf_pipeline
+    """
+    data_raw = load_dataset()
+    # Extract categories (excluding 'Id' and 'Heading')
+    categories = list(data_raw.columns[2:])
+    if SEARCH_ON_TEXT:
+        x_train_text, x_test_text, y_train, y_test = split_dataset(data_raw)
+        vectorizer, best_clf_pipeline = train_text_model(x_train_text, y_train)
+        x_test = parallel_tfidf.transform(vectorizer, x_test_text)
+    else:
+        vectorizer, x_train, x_test, y_train, y_test = vectorize_dataset(data_raw)
+        best_clf_pipeline = train_model(x_train, y_train)
+
+    # Evaluate the model on test data
+    y_pred = best_clf_pipeline.predict(x_test)
+    accuracy = accuracy_score(y_test, y_pred)
+    print("Test Accuracy:", accuracy)
+    if metrics is not None:
+        metrics["test_accuracy"] = float(accuracy)
+    return categories, vectorizer, best_clf_pipeline
+
+
+def training_config():
+    """
+    The settings that decide what model is trained, as stored with every model version.
+    """
+    import sklearn
+    return {
+        "feature_backend": FEATURE_BACKEND,
+        "hashing_n_features": HASHING_N_FEATURES,
+        "hashing_use_idf": HASHING_USE_IDF,
+        "min_df": MIN_DF,
+        "max_df": MAX_DF,
+        "select_k_per_label": SELECT_K_PER_LABEL,
+        "shuffle_seed": SHUFFLE_SEED,
+        "split_seed": SPLIT_SEED,
+        "test_size": TEST_SIZE,
+        "training_engine": TRAINING_ENGINE,
+        "search_mode": SEARCH_MODE,
+        "param_grid": param_grid,
+        "halving": [HALVING_FACTOR, HALVING_MIN_RESOURCES, HALVING_MAX_RESOURCES, HALVING_CV],
+        "search_on_text": SEARCH_ON_TEXT,
+        "sklearn_version": sklearn.__version__,
+    }
+
+
+def train_and_publish():
+    """
+    Makes the model for the current dataset, code and configuration the current version.
+
+    If the registry already has that version, it is only made current; otherwise
+    the model is trained from scratch and published with its metrics and training time,
+    and with its compiled scorer if it is a supported linear model (see linear_scorer.py).
+
+    Returns:
+        tuple: categories, vectorizer, best_clf_pipeline
+    """
+    config = training_config()
+    version = model_registry.training_key(DATA_PATH, config, CODE_PATHS)
+    if model_registry.has_version(version):
+        model_registry.set_current(version)
+        print(f"Model version {version} is up to date.")
+        return model_registry.load_version(version)
+
+    # Cached files of another version would otherwise be reused
+    for path in (VECTORIZER_PATH, MODEL_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+    start = time.perf_counter()
+    metrics = {}
+    model = train(metrics)
+    files = {model_registry.VECTORIZER_FILE: VECTORIZER_PATH, model_registry.MODEL_FILE: MODEL_PATH}
+    if os.path.exists(preprocessing.PREPROCESSING_PATH):
+        files[model_registry.PREPROCESSING_FILE] = preprocessing.PREPROCESSING_PATH
+    import linear_scorer
+    if linear_scorer.compile_if_supported(*model, linear_scorer.LINEAR_SCORER_DIR):
+        files[linear_scorer.LINEAR_SCORER_DIR] = linear_scorer.LINEAR_SCORER_DIR
+    model_registry.publish(version, files, {
+        "categories": model[0],
+        "config": config,
+        "metrics": metrics,
+        "training_time": time.perf_counter() - start,
+    })
+    return model
+
+
+def served_version():
+    """
+    The registry version this process serves, or None without a registry.
+
+    CURRENT is read once, so the model, its scorer and its thresholds always come
+    from the same version, even if another version is published or rolled back
+    meanwhile; a process serves a new version after a restart.
+    """
+    global _served_version
+    if _served_version is None:
+        _served_version = model_registry.current_version() or ""
+    return _served_version or None
+
+
+def model_dir():
+    """
+    The directory of the served model and of the files derived from it (see thresholds.py
+    and linear_scorer.py): its registry version, or the working directory without a registry.
+    """
+    version = served_version()
+    return model_registry.version_dir(version) if version else "."
+
+
+def load_model():
+    """
+    Returns the categories, the fitted vectorizer and the trained model for other scripts.
+
+    The current version of the model registry is loaded without reading the
+    dataset. Without a registry, cached vectorizer and model files are used
+    if both exist; otherwise the model is trained and published first. The
+    result is kept in memory, so later calls are free.
+
+    Returns:
+        tuple: categories, vectorizer, best_clf_pipeline
+    """
+    global _model, _served_version
+    if _model is None:
+        version = served_version()
+        if version is not None:
+            _model = model_registry.load_version(version, mmap_mode=MMAP_MODE)
+        elif os.path.exists(VECTORIZER_PATH) and os.path.exists(MODEL_PATH):
+            _model = (load_categories(), joblib.load(VECTORIZER_PATH, mmap_mode=MMAP_MODE),
+                      joblib.load(MODEL_PATH, mmap_mode=MMAP_MODE))
+        else:
+            _model = train_and_publish()
+            _served_version = model_registry.current_version()
+    return _model
+
+
+def main():
+    """
+    Trains the model if the dataset, code or configuration changed, and makes it current.
+    """
+    global _model, _served_version
+    _model = train_and_publish()
+    _served_version = model_registry.current_version()
+    return _model
+
 
-# Evaluate the model on test data
-y_pred = best_clf_pipeline.predict(x_test)
-accuracy = accuracy_score(y_test, y_pred)
-print("Test Accuracy:", accuracy)
-
-# Expose key objects for other scripts
-# These variables can be imported by other modules
-categories = categories
-x_train = x_train
-vectorizer = vectorizer
-best_clf_pipeline = best_clf_pipeline
+if __name__ == "__main__":
+    main()
 
 """
 Best parameters: {'clf__estimator__C': 10, 'clf__estimator__gamma': 0.0001, 'clf__estimator__kernel': 'linear'}
@@ -3,48 +3,83 @@ MLModelReturns_4.py
 
 This script automatically classifies news articles fetched from RSS feeds using a pre-trained machine learning model.
 It:
-  - Imports 'MyTheFinalList' from FullRSSList_1_2.py
+  - Takes the final article list built by FullRSSList_1_2.py
   - Loads the trained model (best_clf_pipeline) and supporting objects (categories, vectorizer) from MLModelMLC_3.py
+    the first time articles are classified
   - Preprocesses the RSS article data for classification
-  - Uses the model to predict categories, ensuring each article receives at least one category
-  - Validates and structures the predictions in a dictionary format
+  - Uses the model to predict categories, ensuring each article receives at least one category;
+    each category has its own threshold if the model was tuned (see thresholds.py)
+  - Scores with the compiled linear scorer instead of the sklearn pipeline if the model
+    was compiled (see linear_scorer.py)
+  - Validates and structures the predictions as Article records (see article.py)
 """
 
 import json
 import numpy as np
-from FullRSSList_1_2 import MyTheFinalList
-from MLModelMLC_3 import categories, vectorizer, best_clf_pipeline
-
-# Define the classification probability threshold
+import linear_scorer
+import parallelism
+import thresholds
+from article import Article
+from MLModelMLC_3 import load_model, model_dir, served_version
+
+# Define the classification probability threshold; used for the categories
+# without a tuned threshold (see thresholds.py)
 THRESHOLD = 0.3
 
+# BLAS/OpenMP threads used while classifying (see parallelism.py). The app and the
+# pipeline classify in several processes at once, so each one uses a single thread;
+# None leaves the thread count uncapped. The cap is set once, when the model is loaded
+BLAS_THREADS = 1
+
+# (categories, predict_proba, thresholds) of the served model, filled in by load_classifier()
+_classifier = None
+
 def preprocess_text(article_list):
     """
     Combines article title and summary into a single text representation for classification.
     """
-    return [f"{article[0]} {article[1]}" for article in article_list if article[0].strip() and article[1].strip()]
+    return [f"{article.title} {article.summary}" for article in article_list
+            if article.title.strip() and article.summary.strip()]
+
+def load_classifier():
+    """
+    Loads everything classify_articles needs from the served model version, once per process:
+    its compiled scorer (or vectorizer and model), categories and thresholds. The version is
+    resolved once (see MLModelMLC_3.served_version), and the BLAS cap is set here.
+
+    Returns:
+        tuple: categories, predict_proba (texts -> probabilities), thresholds
+    """
+    global _classifier
+    if _classifier is None:
+        parallelism.cap_blas(BLAS_THREADS)
+        if served_version() is None:
+            # Without a registry, load_model() may train and publish a version first
+            load_model()
+        directory = model_dir()
+        scorer = linear_scorer.load_scorer(directory)
+        if scorer is not None:
+            categories, predict_proba = scorer.categories, scorer.predict_proba
+        else:
+            categories, vectorizer, best_clf_pipeline = load_model()
+
+            def predict_proba(texts):
+                return best_clf_pipeline.predict_proba(vectorizer.transform(texts))
+        _classifier = (categories, predict_proba, thresholds.load_thresholds(categories, THRESHOLD, directory))
+    return _classifier
 
 def classify_articles(articles_texts):
     """
     Transforms preprocessed article texts into numerical features and classifies them using the trained model.
     Ensures that each article gets at least one category.
     """
-    transformed_texts = vectorizer.transform(articles_texts)
-    predictions = best_clf_pipeline.predict_proba(transformed_texts)
-    
-    classified_results = []
-    for prob_vector in predictions:
-        # Identify categories that meet the threshold
-        predicted_categories = [categories[i] for i, prob in enumerate(prob_vector) if prob >= THRESHOLD]
-        
-        # If no category meets the threshold, select the one with the highest probability
-        if not predicted_categories:
-            best_category = categories[np.argmax(prob_vector)]
-            predicted_categories = [best_category]
-        
-        classified_results.append(predicted_categories)
-    
-    return classified_results
+    categories, predict_proba, category_thresholds = load_classifier()
+    predictions = predict_proba(articles_texts)
+
+    # Categories that meet their threshold; if none does, the one with the highest probability
+    selected = thresholds.predict(predictions, category_thresholds)
+    categories = np.array(categories, dtype=object)
+    return [categories[row].tolist() for row in selected]
 
 # Function to replace incorrect category names with correct ones
 def fix_category_names(predicted_labels):
@@ -61,43 +96,89 @@ def fix_category_names(predicted_labels):
 def create_final_dict(article_list, predicted_labels):
     """
     Combines original article data with predicted categories and fixes category names.
+
+    Returns:
+        list: Article records with their 'categories' filled in.
     """
     fixed_labels = fix_category_names(predicted_labels)  # Apply category name corrections
 
     return [
-        {
-            "title": article[0],
-            "summary": article[1],
-            "link": article[2],
-            "published": article[3],
-            "categories": fixed_labels[i]  # Use corrected category names
-        }
+        article._replace(categories=fixed_labels[i])
         for i, article in enumerate(article_list)
     ]
 
 def validate_data(final_list):
     """
-    Validates the generated dictionary structure.
+    Validates the generated Article records.
     """
-    return [item for item in final_list if isinstance(item, dict)]
+    return [item for item in final_list if isinstance(item, Article)]
 
-def main():
+def classify_stories(article_list, story_index):
     """
-    Main execution function to preprocess articles, classify them, structure results, and validate.
+    Groups articles into stories and classifies only one article per unclassified story.
+
+    Every other copy of a story reuses the story's categories, as long as they were
+    assigned by the model version that is served now.
+
+    Returns:
+        list: Article records with their 'categories' and 'story_id' filled in.
     """
-    global validDict
-    articles_texts = preprocess_text(MyTheFinalList)
-    predicted_labels = classify_articles(articles_texts)
+    load_classifier()  # Resolves the served version
+    story_index.use_model(served_version())
+    story_ids = [story_index.assign(article) for article in article_list]
+
+    # One representative per story that has no categories yet
+    representatives = {}
+    for i, story_id in enumerate(story_ids):
+        if story_id not in story_index.categories and story_id not in representatives:
+            representatives[story_id] = i
+    if representatives:
+        texts = preprocess_text([article_list[i] for i in representatives.values()])
+        for story_id, labels in zip(representatives, fix_category_names(classify_articles(texts))):
+            story_index.categories[story_id] = labels
 
+    return [
+        article._replace(categories=story_index.categories[story_id], story_id=story_id)
+        for article, story_id in zip(article_list, story_ids)
+    ]
+
+def classify_final_list(final_list, story_index=None):
+    """
+    Classifies a list of Article records and returns the validated records with their categories.
+
+    Articles with an empty title or summary are left out. With a story index
+    (near_duplicates.StoryIndex), near-duplicate articles are classified once per story.
+    """
     # Remove articles with empty title or summary
-    filtered_final_list = [article for article in MyTheFinalList if article[0].strip() and article[1].strip()]
+    filtered_final_list = [article for article in final_list if article.title.strip() and article.summary.strip()]
+    if not filtered_final_list:
+        return []
 
-    print(f"Filtered MyTheFinalList length: {len(filtered_final_list)}")
-    print(f"Predicted labels length: {len(predicted_labels)}")
+    if story_index is not None:
+        return validate_data(classify_stories(filtered_final_list, story_index))
 
+    articles_texts = preprocess_text(filtered_final_list)
+    predicted_labels = classify_articles(articles_texts)
     final_data = create_final_dict(filtered_final_list, predicted_labels)
-    validDict = validate_data(final_data)
-    print(json.dumps(validDict, indent=4, ensure_ascii=False))
+    return validate_data(final_data)
+
+
+def main(final_list=None, story_index=None):
+    """
+    Main execution function to preprocess articles, classify them, structure results, and validate.
+
+    Args:
+        final_list (list): Articles from FullRSSList_1_2.build_final_list(). If None, the RSS feeds are fetched.
+        story_index (StoryIndex): Index used to classify near-duplicate articles once per story, or None.
+    """
+    if final_list is None:
+        from RssArticles_1 import RSS_URLS, fetch_rss_feeds
+        from FullRSSList_1_2 import build_final_list
+        final_list = build_final_list(fetch_rss_feeds(RSS_URLS))
+
+    validDict = classify_final_list(final_list, story_index)
+    print(f"Classified articles: {len(validDict)} of {len(final_list)}")
+    print(json.dumps([article._asdict() for article in validDict], indent=4, ensure_ascii=False))
     return validDict
 
 
@@ -3,14 +3,28 @@
 """
 RssArticles_1.py
 
-This Python script retrieves and parses RSS feeds from three Swedish news 
-sources (Dagens Nyheter, SVT, and Aftonbladet) using the feedparser library. 
-It iterates through the provided RSS URLs, extracts the news entries from each 
-feed, and stores them in a list called `posts`, which can be imported into 
-other scripts.
+This Python script retrieves and parses RSS feeds from three Swedish news
+sources (Dagens Nyheter, SVT, and Aftonbladet) using the feedparser library.
+The feeds are downloaded concurrently by a bounded thread pool, with a timeout
+for each feed and for the whole fetch cycle, so one slow host cannot stall the
+run. The ETag and Last-Modified validators of every feed are kept on disk and
+sent on the next poll, so feeds that have not changed answer 304 and are not
+downloaded or parsed again. New validators are only committed to the store
+once the feed's articles have been stored (see commit_validators), so a
+failed run downloads the same feeds again instead of losing their articles.
+The news entries from each feed are stored in a list called `posts` by
+fetch_rss_feeds(), which other scripts call when they need the articles.
+Nothing is fetched when the module is imported.
 
 """
 
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+
 import feedparser
 
 # Define RSS feed URLs
@@ -20,31 +34,257 @@ RSS_URLS = [
     'https://rss.aftonbladet.se/rss2/small/pages/sections/senastenytt/'
 ]
 
-def fetch_rss_feeds(urls):
+# Concurrency and timeout settings for the fetch engine
+MAX_WORKERS = 16      # Maximum number of feeds downloaded at the same time
+FEED_TIMEOUT = 10     # Seconds allowed for downloading a single feed
+CYCLE_TIMEOUT = 30    # Seconds allowed for the whole fetch cycle
+USER_AGENT = "ML-grupp6-newsfetcher/1.0"
+READ_CHUNK_SIZE = 64 * 1024
+
+# Path to the per-feed store of ETag / Last-Modified validators
+VALIDATOR_PATH = "feed_validators.json"
+# Validators of the last fetch, waiting for its articles to be stored
+PENDING_VALIDATOR_PATH = "feed_validators.pending.json"
+
+
+def load_validators(path=VALIDATOR_PATH):
+    """
+    Load the stored ETag / Last-Modified validators for each feed.
+
+    Args:
+        path (str): Path to the validator store.
+
+    Returns:
+        dict: Maps feed URL to a dict with the keys 'etag' and 'modified'.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read feed validators from {path}: {e}")
+        return {}
+
+
+def save_validators(validators, path=VALIDATOR_PATH):
+    """
+    Save the feed validators, replacing the old store atomically.
+
+    Args:
+        validators (dict): Maps feed URL to a dict with the keys 'etag' and 'modified'.
+        path (str): Path to the validator store.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(validators, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def commit_validators(updates, path=VALIDATOR_PATH):
+    """
+    Commit new validators to the store, once the articles of their feeds have been stored.
+
+    Args:
+        updates (dict): Maps feed URL to its new validator, or to None to forget the feed's validator.
+        path (str): Path to the validator store.
+    """
+    if not updates:
+        return
+    validators = load_validators(path)
+    for url, validator in updates.items():
+        if validator:
+            validators[url] = validator
+        else:
+            validators.pop(url, None)
+    save_validators(validators, path)
+
+
+def commit_pending_validators(pending_path=PENDING_VALIDATOR_PATH, path=VALIDATOR_PATH):
+    """
+    Commit the validators saved by fetch_rss_feeds() and remove the pending file.
+    """
+    if not os.path.exists(pending_path):
+        return
+    commit_validators(load_validators(pending_path), path)
+    os.remove(pending_path)
+
+
+def download_feed(url, timeout=FEED_TIMEOUT, validator=None):
+    """
+    Download the raw content of a single feed within a total time limit.
+
+    If a validator is given, the request is made conditional on it.
+
+    Args:
+        url (str): RSS feed URL.
+        timeout (float): Seconds allowed for the whole download.
+        validator (dict): Stored 'etag' and 'modified' values for the feed, or None.
+
+    Returns:
+        tuple: The response body (bytes, or None if the server answered 304 Not Modified)
+               and the response headers (dict with lowercase keys).
+    """
+    deadline = time.monotonic() + timeout
+    request_headers = {"User-Agent": USER_AGENT}
+    if validator:
+        if validator.get("etag"):
+            request_headers["If-None-Match"] = validator["etag"]
+        if validator.get("modified"):
+            request_headers["If-Modified-Since"] = validator["modified"]
+    request = urllib.request.Request(url, headers=request_headers)
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, {key.lower(): value for key, value in e.headers.items()}
+        raise
+    with response:
+        headers = {key.lower(): value for key, value in response.headers.items()}
+        chunks = []
+        while True:
+            # The socket timeout only limits each read, so also check the total deadline
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"timed out after {timeout} seconds")
+            chunk = response.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b"".join(chunks), headers
+
+
+def fetch_feed(url, timeout=FEED_TIMEOUT, validator=None):
+    """
+    Download and parse a single RSS feed.
+
+    A feed that answers 304 Not Modified is not parsed and gives no entries.
+
+    Args:
+        url (str): RSS feed URL.
+        timeout (float): Seconds allowed for downloading the feed.
+        validator (dict): Stored 'etag' and 'modified' values for the feed, or None.
+
+    Returns:
+        tuple: The feed entries (an empty list if the feed was unchanged or could not be parsed)
+               and the validator to store for the next poll (None if the server sent none).
+    """
+    content, headers = download_feed(url, timeout, validator)
+    if content is None:
+        return [], validator
+    new_validator = None
+    if headers.get("etag") or headers.get("last-modified"):
+        new_validator = {"etag": headers.get("etag"), "modified": headers.get("last-modified")}
+    feed = feedparser.parse(content, response_headers=headers)
+    if feed.bozo:  # bozo attribute indicates a parsing error
+        print(f"Warning: Could not parse feed from {url}")
+        return [], None
+    return feed.entries, new_validator
+
+
+def iter_rss_feeds(urls, max_workers=MAX_WORKERS, feed_timeout=FEED_TIMEOUT, cycle_timeout=CYCLE_TIMEOUT,
+                   validators=None):
+    """
+    Fetch RSS feeds concurrently and yield each feed as soon as it has been parsed.
+
+    At most max_workers feeds are submitted at a time, and a feed is released
+    once it has been yielded, so no more than max_workers parsed feeds are held
+    in memory. Feeds that fail are reported and skipped. The cycle timeout only
+    counts time spent waiting for downloads, not the time the consumer spends
+    on the yielded feeds; feeds that have finished downloading are always
+    yielded, and only feeds still downloading (or not yet started) when it
+    expires are abandoned.
+
+    Args:
+        urls (list): List of RSS feed URLs.
+        max_workers (int): Maximum number of feeds downloaded at the same time.
+        feed_timeout (float): Seconds allowed for each feed.
+        cycle_timeout (float): Seconds allowed for the whole cycle, or None for no limit.
+        validators (dict): Validator store from load_validators(), or None to always download
+            every feed. It is only read; commit the yielded validators with commit_validators()
+            once the entries have been stored.
+
+    Yields:
+        tuple: The feed URL, its list of entries and its new validator (None if the server sent
+            none), in completion order.
+    """
+    if not urls:
+        return
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+    waiting = iter(urls)
+    running = {}
+
+    def submit_next():
+        for url in waiting:
+            validator = validators.get(url) if validators is not None else None
+            running[executor.submit(fetch_feed, url, feed_timeout, validator)] = url
+            return
+
+    for _ in range(min(max_workers, len(urls))):
+        submit_next()
+    deadline = None if cycle_timeout is None else time.monotonic() + cycle_timeout
+    try:
+        while running:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                skipped = list(running.values()) + list(waiting)
+                print(f"Warning: Fetch cycle timed out, skipping {len(skipped)} feed(s): {', '.join(skipped)}")
+                return
+            while done:
+                future = done.pop()
+                url = running.pop(future)
+                submit_next()
+                try:
+                    entries, validator = future.result()
+                except Exception as e:
+                    print(f"Error fetching {url}: {e}")
+                    continue
+                consumer_start = time.monotonic()
+                yield url, entries, validator
+                entries = None  # Release the parsed feed before waiting for the next one
+                if deadline is not None:
+                    deadline += time.monotonic() - consumer_start
+    finally:
+        # Do not wait for abandoned downloads; they end on their own feed timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_rss_feeds(urls, max_workers=MAX_WORKERS, feed_timeout=FEED_TIMEOUT, cycle_timeout=CYCLE_TIMEOUT,
+                    validator_path=VALIDATOR_PATH, pending_path=PENDING_VALIDATOR_PATH):
     """
     Fetch and parse RSS feeds from a list of URLs.
 
+    The feeds are downloaded concurrently, so a cycle takes about as long as the
+    slowest feed. The entries are returned in the same order as `urls`. Feeds
+    that have not changed since the previous poll give no entries. The new
+    validators are saved to pending_path; call commit_pending_validators() once
+    the articles have been stored.
+
     Args:
         urls (list): List of RSS feed URLs.
+        max_workers (int): Maximum number of feeds downloaded at the same time.
+        feed_timeout (float): Seconds allowed for each feed.
+        cycle_timeout (float): Seconds allowed for the whole cycle, or None for no limit.
+        validator_path (str): Path to the validator store, or None to download every feed.
+        pending_path (str): Path to save the new validators to, or None to drop them.
 
     Returns:
         list: A list containing all RSS feed entries.
     """
+    validators = load_validators(validator_path) if validator_path else None
+    entries_by_url = {}
+    pending = {}
+    for url, entries, validator in iter_rss_feeds(urls, max_workers, feed_timeout, cycle_timeout, validators):
+        entries_by_url[url] = entries
+        pending[url] = validator
+    if validator_path and pending_path:
+        save_validators(pending, pending_path)
     posts = []
     for url in urls:
-        try:
-            feed = feedparser.parse(url)
-            if feed.bozo:  # bozo attribute indicates a parsing error
-                print(f"Warning: Could not parse feed from {url}")
-                continue
-            posts.extend(feed.entries)
-        except Exception as e:
-            print(f"Error fetching {url}: {e}")
+        posts.extend(entries_by_url.get(url, []))
     return posts
 
-# Store the fetched posts in a variable that can be imported
-posts = fetch_rss_feeds(RSS_URLS)
-
 # Run as a script and print the number of articles when executed directly
 if __name__ == "__main__":
+    posts = fetch_rss_feeds(RSS_URLS)
     print(f"Retrieved {len(posts)} articles.")
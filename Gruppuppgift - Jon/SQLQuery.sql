@@ -8,9 +8,14 @@ CREATE TABLE IF NOT EXISTS news (
     summary TEXT NOT NULL,
     link VARCHAR(500) NOT NULL UNIQUE,  -- Ensures no duplicate articles
     published DATETIME NOT NULL,
-    topic JSON NOT NULL
+    topic JSON NOT NULL,
+    story_id BIGINT NULL,  -- Groups near-duplicate articles from different sources
+    INDEX idx_news_story_id (story_id)
 );
 
+-- For a 'news' table created before story_id existed:
+-- ALTER TABLE news ADD COLUMN story_id BIGINT NULL, ADD INDEX idx_news_story_id (story_id);
+
 -- Create the 'category_counts' table to store category statistics
 CREATE TABLE IF NOT EXISTS category_counts (
     id INT AUTO_INCREMENT PRIMARY KEY,
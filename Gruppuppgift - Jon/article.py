@@ -0,0 +1,59 @@
+"""
+article.py
+
+The record types that carry news articles through the pipeline.
+
+  - Article: one article as a compact named tuple (title, summary, link,
+    published, categories, story_id). It has no per-instance dict, and it still supports
+    the positional access (article[0] ... article[3]) the scripts used for the
+    old 4-element lists.
+  - ArticleBatch: the columnar form of many articles, one list per field. It is
+    built straight from the feedparser entries, so a batch of RSS items is
+    never copied into one dict per article.
+"""
+
+from collections import namedtuple
+
+Article = namedtuple("Article", ["title", "summary", "link", "published", "categories", "story_id"],
+                     defaults=((), None))
+
+
+class ArticleBatch:
+    """
+    Columnar batch of articles: one list per field.
+
+    'published' holds the raw date strings until the batch is normalized, and
+    'published_parsed' the date tuples that feedparser has already parsed.
+    """
+
+    __slots__ = ("titles", "summaries", "links", "published", "published_parsed")
+
+    def __init__(self, titles, summaries, links, published, published_parsed=None):
+        self.titles = titles
+        self.summaries = summaries
+        self.links = links
+        self.published = published
+        self.published_parsed = published_parsed if published_parsed is not None else [None] * len(titles)
+
+    @classmethod
+    def from_posts(cls, posts):
+        """
+        Builds a batch from RSS feed entries, using empty strings for missing fields.
+        """
+        return cls(
+            [post.get("title", "") for post in posts],
+            [post.get("summary", "") for post in posts],
+            [post.get("link", "") for post in posts],
+            [post.get("published", "") for post in posts],
+            # Date tuple (UTC) already parsed by feedparser, if any
+            [post.get("published_parsed") or post.get("updated_parsed") for post in posts],
+        )
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __iter__(self):
+        """
+        Yields the batch as Article records.
+        """
+        return map(Article, self.titles, self.summaries, self.links, self.published)
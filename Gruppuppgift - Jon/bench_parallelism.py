@@ -0,0 +1,95 @@
+"""
+bench_parallelism.py
+
+Benchmark of the parallelism settings of MLModelMLC_3.py (see parallelism.py).
+
+It vectorizes the training split once, then runs the same small SVC grid
+search with different divisions of the cores between search workers, label
+jobs and BLAS threads, and prints the wall time of each. The first row is
+the old behaviour: n_jobs=-1 and no BLAS cap.
+
+Usage:
+    python bench_parallelism.py [--cores 32] [--splits 32x1x1,16x2x1,8x2x2] [--rows 2000]
+"""
+
+import argparse
+import time
+
+from sklearn.model_selection import GridSearchCV
+from sklearn.pipeline import Pipeline
+
+import MLModelMLC_3
+import parallel_tfidf
+import parallelism
+
+# Small grid with both kernels; the timings scale with the size of the real grid
+BENCH_GRID = [
+    {'clf__estimator__C': [1, 10], 'clf__estimator__kernel': ['linear']},
+    {'clf__estimator__C': [10], 'clf__estimator__kernel': ['rbf'], 'clf__estimator__gamma': [0.01]},
+]
+
+
+def default_splits(n_cores):
+    """
+    Returns (search_jobs, label_jobs, blas_threads) divisions of n_cores worth comparing.
+    """
+    candidates = [(n_cores, 1, 1), (n_cores // 2, 2, 1), (n_cores // 2, 1, 2),
+                  (n_cores // 4, 2, 2), (1, n_cores, 1), (1, 1, n_cores)]
+    splits = []
+    for split in candidates:
+        if min(split) >= 1 and split not in splits:
+            splits.append(split)
+    return splits
+
+
+def parse_splits(text):
+    """
+    Parses "SxLxB,..." into (search_jobs, label_jobs, blas_threads) tuples.
+    """
+    return [tuple(int(part) for part in split.split("x")) for split in text.split(",")]
+
+
+def time_search(x_train, y_train, search_jobs, label_jobs, blas_threads, cv):
+    """
+    Returns the wall time of one grid search over BENCH_GRID.
+    """
+    pipeline = Pipeline([('clf', MLModelMLC_3.build_classifier(label_jobs))])
+    grid = GridSearchCV(pipeline, BENCH_GRID, cv=cv, scoring='accuracy', n_jobs=search_jobs)
+    start = time.perf_counter()
+    with parallelism.limits(blas_threads):
+        grid.fit(x_train, y_train)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark divisions of the cores during training.")
+    parser.add_argument("--data", help="Annotated dataset (default: MLModelMLC_3.DATA_PATH).")
+    parser.add_argument("--cores", type=int, help="Cores to divide (default: every core).")
+    parser.add_argument("--splits", help="Comma-separated SEARCHxLABELxBLAS divisions (default: a selection).")
+    parser.add_argument("--rows", type=int, help="Use only the first ROWS training headlines.")
+    parser.add_argument("--cv", type=int, default=3, help="Cross-validation folds.")
+    args = parser.parse_args()
+
+    n_cores = parallelism.plan(args.cores)["n_cores"]
+    splits = parse_splits(args.splits) if args.splits else default_splits(n_cores)
+    for split in splits:
+        parallelism.plan(n_cores, *split)  # Rejects divisions that need more cores
+
+    data_raw = MLModelMLC_3.load_dataset(args.data)
+    x_train_text, _, y_train, _ = MLModelMLC_3.split_dataset(data_raw)
+    if args.rows:
+        x_train_text, y_train = x_train_text[:args.rows], y_train[:args.rows]
+    x_train = parallel_tfidf.fit_transform(MLModelMLC_3.build_vectorizer(), x_train_text)
+
+    print(f"{x_train.shape[0]} headlines, {x_train.shape[1]} features, {n_cores} cores, cv={args.cv}")
+    print(f"{'search':>6} {'labels':>6} {'blas':>6} {'wall time':>10}")
+    baseline = time_search(x_train, y_train, -1, None, None, args.cv)
+    print(f"{'-1':>6} {'-':>6} {'-':>6} {baseline:>9.1f}s  (uncapped)")
+    for search_jobs, label_jobs, blas_threads in splits:
+        wall_time = time_search(x_train, y_train, search_jobs, label_jobs, blas_threads, args.cv)
+        print(f"{search_jobs:>6} {label_jobs:>6} {blas_threads:>6} {wall_time:>9.1f}s  "
+              f"(speedup {baseline / wall_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+bench_publish_dates.py
+
+Micro-benchmark for publish-date normalization in FullRSSList_1_2.py.
+
+It builds synthetic RSS items the way feedparser returns them (an RFC 822
+'published' string in Swedish local time plus the parsed UTC tuple), runs
+both the old strptime loop and format_rss_data() over them, checks that the
+results are identical, and prints the timings. The string-only run measures
+the strptime fallback used when feedparser could not parse a date.
+
+Usage:
+    python bench_publish_dates.py [--entries 100000]
+"""
+
+import argparse
+import datetime
+import random
+import time
+
+from article import ArticleBatch
+from FullRSSList_1_2 import DATE_FORMATS, format_rss_data
+
+# Each feed writes its dates in one style: Swedish local time with an offset, or GMT
+FEED_HOSTS = {"www.dn.se": "offset", "www.svt.se": "gmt", "www.aftonbladet.se": "offset"}
+
+
+def legacy_format_rss_data(batch):
+    """
+    The previous format_rss_data loop: up to three strptime attempts per item, falling back to 1970.
+    """
+    formatted_list = []
+    for item in batch:
+        parsed_date = None
+        for fmt in DATE_FORMATS:
+            try:
+                parsed_date = datetime.datetime.strptime(item.published, fmt)
+                break
+            except ValueError:
+                continue
+        if not parsed_date:
+            parsed_date = datetime.datetime(1970, 1, 1)
+        formatted_list.append(item._replace(published=parsed_date.strftime("%Y-%m-%d %H:%M:%S")))
+    return formatted_list
+
+
+def generate_items(n, seed=42):
+    """
+    Generates a batch of n synthetic RSS items with realistic date strings and tuples.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    posts = []
+    for i in range(n):
+        utc_time = start + datetime.timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        host = rng.choice(list(FEED_HOSTS))
+        if FEED_HOSTS[host] == "offset":
+            # CET (+0100) in winter, CEST (+0200) in summer
+            offset_hours = 2 if 4 <= utc_time.month <= 10 else 1
+            local_time = utc_time.astimezone(datetime.timezone(datetime.timedelta(hours=offset_hours)))
+            published = local_time.strftime("%a, %d %b %Y %H:%M:%S %z")
+        else:
+            published = utc_time.strftime("%a, %d %b %Y %H:%M:%S GMT")
+        posts.append({
+            "title": f"Rubrik {i}",
+            "summary": f"Sammanfattning {i}",
+            "link": f"https://{host}/nyheter/{i}",
+            "published": published,
+            "published_parsed": utc_time.timetuple(),
+        })
+    return ArticleBatch.from_posts(posts)
+
+
+def time_call(function, items, repeat=3):
+    """
+    Returns the best wall time of `repeat` runs and the result of the last run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(items)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark publish-date normalization.")
+    parser.add_argument("--entries", type=int, default=100_000, help="Number of synthetic entries.")
+    args = parser.parse_args()
+
+    items = generate_items(args.entries)
+    # Entries without a parsed tuple exercise the per-feed strptime fallback
+    string_only = ArticleBatch(items.titles, items.summaries, items.links, items.published)
+
+    legacy_time, legacy_result = time_call(legacy_format_rss_data, items)
+    tuple_time, tuple_result = time_call(format_rss_data, items)
+    string_time, string_result = time_call(format_rss_data, string_only)
+
+    assert tuple_result == legacy_result, "format_rss_data (tuples) differs from the legacy loop"
+    assert string_result == legacy_result, "format_rss_data (strings) differs from the legacy loop"
+
+    print(f"Entries: {args.entries}")
+    print(f"Legacy strptime loop:        {legacy_time:.3f} s")
+    print(f"Parsed tuples (vectorized):  {tuple_time:.3f} s  (speedup {legacy_time / tuple_time:.1f}x)")
+    print(f"Strings, per-feed format:    {string_time:.3f} s  (speedup {legacy_time / string_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+feature_backends.py
+
+Alternative feature backend for the classifier: the hashing trick with
+streaming IDF weights.
+
+The TF-IDF vectorizer keeps every uni-, bi- and trigram it has seen in its
+vocabulary, which grows without limit with the corpus. HashingTfidfVectorizer
+instead hashes each n-gram into one of n_features columns, so it keeps no
+vocabulary; its only state is the document frequency of every column, which
+is learned in a streaming pass (partial_fit on one batch at a time). Memory
+therefore stays at n_features counters however many articles it is fitted on.
+
+It is a scikit-learn transformer with the same fit/transform interface as
+TfidfVectorizer, so the training code (including the search Pipeline of
+SEARCH_ON_TEXT) and MLModelReturns_4.classify_articles use it unchanged.
+Select it with FEATURE_BACKEND = "hashing" in MLModelMLC_3.py.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+# Number of hash columns; more columns mean fewer collisions between n-grams
+DEFAULT_N_FEATURES = 2 ** 20
+# Documents hashed at a time when fitting on a list of texts
+FIT_BATCH_SIZE = 10_000
+
+
+class HashingTfidfVectorizer(BaseEstimator, TransformerMixin):
+    """
+    Hashes n-grams into a fixed number of columns and (optionally) weights them by IDF.
+
+    Args:
+        tokenizer (callable): Turns a text into tokens (e.g. custom_tokenizer).
+        n_features (int): Number of hash columns.
+        ngram_range (tuple): Smallest and largest n-gram size.
+        use_idf (bool): Weight the counts by smoothed IDF, like TfidfVectorizer.
+        norm (str): Row normalization ('l2', 'l1' or None).
+    """
+
+    def __init__(self, tokenizer, n_features=DEFAULT_N_FEATURES, ngram_range=(1, 3), use_idf=True, norm='l2'):
+        self.tokenizer = tokenizer
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.use_idf = use_idf
+        self.norm = norm
+
+    def _hash_counts(self, texts):
+        hasher = HashingVectorizer(
+            tokenizer=self.tokenizer,
+            preprocessor=None,
+            lowercase=False,
+            token_pattern=None,
+            ngram_range=self.ngram_range,
+            n_features=self.n_features,
+            alternate_sign=False,
+            norm=None,
+        )
+        return hasher.transform(texts)
+
+    def partial_fit(self, texts):
+        """
+        Adds the document frequencies of one batch of texts. Returns self.
+        """
+        self._add_counts(self._hash_counts(texts))
+        return self
+
+    def _add_counts(self, counts):
+        if not hasattr(self, "df_"):
+            self._reset()
+        if self.use_idf:
+            self.df_ += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_docs_ += counts.shape[0]
+
+    def _reset(self):
+        self.n_docs_ = 0
+        self.df_ = np.zeros(self.n_features, dtype=np.int64)
+
+    def fit(self, texts, y=None):
+        """
+        Learns the document frequencies of the texts, FIT_BATCH_SIZE documents at a time. Returns self.
+        """
+        self._reset()
+        texts = list(texts)
+        for start in range(0, len(texts), FIT_BATCH_SIZE):
+            self.partial_fit(texts[start:start + FIT_BATCH_SIZE])
+        return self
+
+    @property
+    def idf_(self):
+        """
+        Smoothed IDF per column: ln((1 + n) / (1 + df)) + 1, as in TfidfVectorizer.
+        """
+        return np.log((1 + self.n_docs_) / (1 + self.df_)) + 1
+
+    def transform(self, texts):
+        """
+        Returns the (IDF-weighted, normalized) hashed feature matrix of the texts.
+        """
+        return self._weight(self._hash_counts(texts))
+
+    def _weight(self, counts):
+        features = counts.astype(np.float64)
+        if self.use_idf:
+            if not getattr(self, "n_docs_", 0):
+                raise ValueError("HashingTfidfVectorizer is not fitted yet; call fit or partial_fit first.")
+            # Scale the stored values in place; only the IDF of the columns present is computed
+            features = sp.csr_matrix(features)
+            features.data *= np.log((1 + self.n_docs_) / (1 + self.df_[features.indices])) + 1
+        if self.norm:
+            features = normalize(features, norm=self.norm, copy=False)
+        return sp.csr_matrix(features)
+
+    def fit_transform(self, texts, y=None):
+        """
+        Learns the document frequencies of the texts and returns their feature matrix, hashing them once.
+        """
+        counts = self._hash_counts(list(texts))
+        self._reset()
+        self._add_counts(counts)
+        return self._weight(counts)
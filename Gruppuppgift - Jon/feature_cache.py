@@ -0,0 +1,155 @@
+"""
+feature_cache.py
+
+On-disk cache of the fitted vectorizer and the vectorized training and test matrices.
+
+Retraining used to re-tokenize and re-vectorize the whole dataset even when
+neither the data nor the vectorizer settings had changed. An entry of this
+cache holds x_train, x_test, the label frames and the files of the fitted
+vectorizer (the pickle and its preprocessing artifact) of one (dataset,
+vectorizer settings, split) combination, under a key made of
+  - a content hash of the dataset CSV
+  - the vectorizer settings (its parameters, tokenizer and feature selection)
+    and the shuffle seed and split settings
+  - content hashes of the code that fits the vectorizer
+
+The key only depends on inputs, so it is checked before anything is fitted:
+on a hit the vectorizer is restored from the entry and the training texts are
+not tokenized at all.
+
+Each sparse matrix is stored as its three CSR arrays in plain .npy files, next
+to a meta.json with shapes and label columns. Plain .npy files (unlike a
+compressed .npz) can be opened memory-mapped, so loading an entry takes
+milliseconds and the arrays are paged in only as they are used.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# Directory of the cache entries, one subdirectory per key
+FEATURE_CACHE_DIR = "feature_cache"
+# Number of entries kept; the least recently written ones are deleted
+MAX_ENTRIES = 5
+# Version of the entry layout; bump it when the layout changes
+CACHE_VERSION = 2
+
+_MATRICES = ("x_train", "x_test")
+_LABELS = ("y_train", "y_test")
+
+
+def _hash_file(digest, path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+
+def feature_key(data_path, settings, code_paths=()):
+    """
+    Returns the cache key of a dataset file, the vectorizer and split settings, and the code.
+
+    Args:
+        data_path (str): The dataset CSV.
+        settings (dict): Everything else that changes the vectorizer or the matrices
+            (vectorizer parameters, feature selection, seeds, test size); JSON-serializable.
+        code_paths (list): Source files whose changes change the fitted vectorizer.
+
+    Returns:
+        str: A 32-character hex key.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(dict(settings, cache_version=CACHE_VERSION), sort_keys=True,
+                             default=str).encode("utf-8"))
+    for path in [data_path] + sorted(code_paths):
+        _hash_file(digest, path)
+    return digest.hexdigest()
+
+
+def load_features(key, cache_dir=FEATURE_CACHE_DIR, mmap_mode="r"):
+    """
+    Loads a cache entry, memory-mapped by default.
+
+    Returns:
+        dict: x_train and x_test (CSR matrices), y_train and y_test (DataFrames),
+            or None if there is no entry for the key.
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    meta_path = os.path.join(entry_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    def load(name):
+        return np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+
+    features = {}
+    for name in _MATRICES:
+        features[name] = sp.csr_matrix((load(f"{name}_data"), load(f"{name}_indices"), load(f"{name}_indptr")),
+                                       shape=tuple(meta["shapes"][name]), copy=False)
+    for name in _LABELS:
+        features[name] = pd.DataFrame(load(name), columns=meta["label_columns"], copy=False)
+    return features
+
+
+def restore_files(key, files, cache_dir=FEATURE_CACHE_DIR):
+    """
+    Copies the files stored with a cache entry back to their paths.
+
+    Args:
+        files (dict): Stored file name -> path to copy it to.
+
+    Returns:
+        bool: False if the entry does not hold every file (nothing is copied then).
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    if not all(os.path.exists(os.path.join(entry_dir, name)) for name in files):
+        return False
+    for name, path in files.items():
+        shutil.copy2(os.path.join(entry_dir, name), path)
+    return True
+
+
+def save_features(key, x_train, x_test, y_train, y_test, cache_dir=FEATURE_CACHE_DIR, files=None):
+    """
+    Saves the matrices and label frames as a cache entry, and deletes the oldest entries.
+
+    Args:
+        files (dict): Stored file name -> path of a file to keep with the entry (see restore_files).
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    tmp_dir = f"{entry_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    shapes = {}
+    for name, matrix in zip(_MATRICES, (x_train, x_test)):
+        matrix = sp.csr_matrix(matrix)
+        for part in ("data", "indices", "indptr"):
+            np.save(os.path.join(tmp_dir, f"{name}_{part}.npy"), getattr(matrix, part))
+        shapes[name] = list(matrix.shape)
+    for name, labels in zip(_LABELS, (y_train, y_test)):
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(labels.to_numpy()))
+    for name, path in (files or {}).items():
+        shutil.copy2(path, os.path.join(tmp_dir, name))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"cache_version": CACHE_VERSION, "shapes": shapes,
+                   "label_columns": list(y_train.columns)}, f, indent=2)
+
+    # Replace the entry in one step, so a reader never sees half an entry
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp_dir, entry_dir)
+    _prune(cache_dir)
+
+
+def _prune(cache_dir):
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+               if not name.endswith(".tmp") and os.path.isdir(os.path.join(cache_dir, name))]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for entry_dir in entries[MAX_ENTRIES:]:
+        shutil.rmtree(entry_dir, ignore_errors=True)
@@ -0,0 +1,353 @@
+"""
+feed_replay_server.py
+
+Local stand-in for the DN, SVT and Aftonbladet RSS endpoints, so the ingest
+pipeline and its benchmarks can run repeatably on an isolated machine.
+
+The server serves two kinds of feeds:
+  - generated feeds: RSS 2.0 or Atom documents built from a synthetic corpus
+    of Swedish headlines drawn from Book1.csv, at /feeds/<n>.xml
+  - recorded feeds: files saved earlier with record_feeds(), at /recorded/<file>
+
+Feed size, response latency, error rate, how often feeds change and whether
+conditional requests are answered with 304 Not Modified are all configurable.
+
+Usage:
+    python feed_replay_server.py --feeds 300 --items 50 --latency 0.2 --error-rate 0.05
+    python feed_replay_server.py --record-dir recorded_feeds
+
+In Python (e.g. a benchmark):
+    with ReplayServer(feeds=300, latency=0.1) as server:
+        posts = fetch_rss_feeds(server.urls)
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+import os
+import random
+import threading
+import time
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+# Annotated headlines used as the source of the synthetic corpus
+HEADLINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Book1.csv")
+SOURCES = ["dn.se", "svt.se", "aftonbladet.se"]
+SWEDISH_TZ = datetime.timezone(datetime.timedelta(hours=1))
+
+
+def load_headlines(path=HEADLINES_PATH):
+    """
+    Reads the 'Heading' column of the annotated dataset.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [row["Heading"] for row in csv.DictReader(f) if row.get("Heading")]
+
+
+def generate_corpus(headlines, n_items, seed=0, start=None):
+    """
+    Generates synthetic articles that look like Swedish news.
+
+    Each article takes its title from one headline and builds its summary from
+    two others, so word statistics follow the real headlines.
+
+    Args:
+        headlines (list): Source headlines.
+        n_items (int): Number of articles to generate.
+        seed (int): Random seed, so the same corpus can be generated again.
+        start (datetime): Publish time of the newest article (default: now).
+
+    Returns:
+        list: Dicts with 'title', 'summary', 'link' and 'published' (an aware datetime), newest first.
+    """
+    rng = random.Random(seed)
+    start = start or datetime.datetime.now(SWEDISH_TZ).replace(microsecond=0)
+    articles = []
+    published = start
+    for i in range(n_items):
+        title, first, second = rng.sample(headlines, 3)
+        source = rng.choice(SOURCES)
+        articles.append({
+            "title": title,
+            "summary": f"{first}. {second}.",
+            "link": f"https://www.{source}/nyheter/{seed}-{i}",
+            "published": published,
+        })
+        published -= datetime.timedelta(minutes=rng.randint(1, 30))
+    return articles
+
+
+def render_rss(articles, title="Syntetiskt nyhetsflöde"):
+    """
+    Renders articles as an RSS 2.0 document (bytes).
+    """
+    items = "".join(
+        "<item>"
+        f"<title>{escape(a['title'])}</title>"
+        f"<description>{escape(a['summary'])}</description>"
+        f"<link>{escape(a['link'])}</link>"
+        f"<guid>{escape(a['link'])}</guid>"
+        f"<pubDate>{format_datetime(a['published'])}</pubDate>"
+        "</item>"
+        for a in articles
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<rss version="2.0"><channel>'
+        f"<title>{escape(title)}</title><link>https://localhost/</link>"
+        f"<description>{escape(title)}</description>{items}"
+        "</channel></rss>"
+    ).encode("utf-8")
+
+
+def render_atom(articles, title="Syntetiskt nyhetsflöde"):
+    """
+    Renders articles as an Atom 1.0 document (bytes).
+    """
+    updated = articles[0]["published"].isoformat() if articles else "1970-01-01T00:00:00+00:00"
+    entries = "".join(
+        "<entry>"
+        f"<title>{escape(a['title'])}</title>"
+        f"<summary>{escape(a['summary'])}</summary>"
+        f'<link href="{escape(a["link"])}"/>'
+        f"<id>{escape(a['link'])}</id>"
+        f"<published>{a['published'].isoformat()}</published>"
+        f"<updated>{a['published'].isoformat()}</updated>"
+        "</entry>"
+        for a in articles
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f"<title>{escape(title)}</title><id>urn:syntetiskt</id><updated>{updated}</updated>"
+        f"{entries}</feed>"
+    ).encode("utf-8")
+
+
+def record_feeds(urls, directory):
+    """
+    Downloads feeds once and saves them, so they can be replayed from /recorded/ later.
+    """
+    from RssArticles_1 import download_feed
+    os.makedirs(directory, exist_ok=True)
+    for i, url in enumerate(urls):
+        content, _ = download_feed(url)
+        with open(os.path.join(directory, f"feed_{i}.xml"), "wb") as f:
+            f.write(content)
+        print(f"Recorded {url} -> feed_{i}.xml")
+
+
+class FeedCatalog:
+    """
+    The generated feeds served by the replay server.
+
+    Every feed is a window of `items` articles over its own synthetic corpus.
+    With a change rate above zero, a request may publish a new article to the
+    feed before it is served, which changes the feed's ETag.
+    """
+
+    def __init__(self, feeds=3, items=50, feed_format="rss", change_rate=0.0, seed=0, headlines=None):
+        self.items = items
+        self.feed_format = feed_format
+        self.change_rate = change_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        headlines = headlines or load_headlines()
+        # Generate enough articles to let every feed change a few hundred times
+        self.corpora = [generate_corpus(headlines, items + 500, seed=seed + n) for n in range(feeds)]
+        self.offsets = [500] * feeds
+        self.documents = [self._render(n) for n in range(feeds)]
+
+    def __len__(self):
+        return len(self.corpora)
+
+    def _render(self, n):
+        offset = self.offsets[n]
+        articles = self.corpora[n][offset:offset + self.items]
+        render = render_atom if self.feed_format == "atom" else render_rss
+        body = render(articles, title=f"Syntetiskt flöde {n}")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        last_modified = format_datetime(articles[0]["published"].astimezone(datetime.timezone.utc), usegmt=True)
+        return body, etag, last_modified
+
+    def get(self, n):
+        """
+        Returns (body, etag, last_modified) of feed n, publishing a new article first with probability change_rate.
+        """
+        with self.lock:
+            if self.offsets[n] > 0 and self.rng.random() < self.change_rate:
+                self.offsets[n] -= 1
+                self.documents[n] = self._render(n)
+            return self.documents[n]
+
+
+def make_handler(catalog, latency=0.0, latency_jitter=0.0, error_rate=0.0, not_modified=True,
+                 record_dir=None, seed=0):
+    """
+    Builds the request handler class for a replay server.
+    """
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass  # Keep benchmark output clean
+
+        def _send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body and self.command != "HEAD":
+                self.wfile.write(body)
+
+        def do_GET(self):
+            with rng_lock:
+                delay = latency + rng.uniform(0, latency_jitter)
+                fail = rng.random() < error_rate
+            if delay:
+                time.sleep(delay)
+            if fail:
+                self._send(503, b"Service Unavailable")
+                return
+
+            if self.path.startswith("/recorded/") and record_dir:
+                name = os.path.basename(self.path)
+                path = os.path.join(record_dir, name)
+                if not os.path.isfile(path):
+                    self._send(404, b"Not Found")
+                    return
+                with open(path, "rb") as f:
+                    body = f.read()
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+                last_modified = format_datetime(
+                    datetime.datetime.fromtimestamp(os.path.getmtime(path), datetime.timezone.utc), usegmt=True)
+            elif self.path.startswith("/feeds/"):
+                try:
+                    n = int(os.path.splitext(os.path.basename(self.path))[0])
+                    if n < 0:
+                        raise IndexError(n)
+                    body, etag, last_modified = catalog.get(n)
+                except (ValueError, IndexError):
+                    self._send(404, b"Not Found")
+                    return
+            else:
+                self._send(404, b"Not Found")
+                return
+
+            if not_modified and (self.headers.get("If-None-Match") == etag
+                                 or self.headers.get("If-Modified-Since") == last_modified):
+                self._send(304, headers={"ETag": etag, "Last-Modified": last_modified})
+                return
+            content_type = "application/atom+xml" if body.lstrip().find(b"<feed") != -1 else "application/rss+xml"
+            self._send(200, body, {
+                "Content-Type": f"{content_type}; charset=utf-8",
+                "ETag": etag,
+                "Last-Modified": last_modified,
+            })
+
+        do_HEAD = do_GET
+
+    return ReplayHandler
+
+
+class ReplayServer:
+    """
+    Runs the replay HTTP server in a background thread.
+
+    Args:
+        feeds (int): Number of generated feeds.
+        items (int): Articles per generated feed.
+        feed_format (str): 'rss' or 'atom'.
+        latency (float): Seconds every response is delayed.
+        latency_jitter (float): Extra random delay of up to this many seconds.
+        error_rate (float): Share of requests answered with 503.
+        change_rate (float): Chance that a feed gets a new article on each request.
+        not_modified (bool): Answer matching conditional requests with 304.
+        record_dir (str): Directory of recorded feeds served under /recorded/, or None.
+        host (str), port (int): Address to listen on; port 0 picks a free port.
+        seed (int): Random seed for the corpus, latencies and errors.
+    """
+
+    def __init__(self, feeds=3, items=50, feed_format="rss", latency=0.0, latency_jitter=0.0, error_rate=0.0,
+                 change_rate=0.0, not_modified=True, record_dir=None, host="127.0.0.1", port=0, seed=0):
+        self.catalog = FeedCatalog(feeds, items, feed_format, change_rate, seed)
+        self.record_dir = record_dir
+        handler = make_handler(self.catalog, latency, latency_jitter, error_rate, not_modified, record_dir, seed)
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def urls(self):
+        """
+        URLs of all generated feeds, followed by all recorded feeds.
+        """
+        urls = [f"{self.base_url}/feeds/{n}.xml" for n in range(len(self.catalog))]
+        if self.record_dir and os.path.isdir(self.record_dir):
+            urls += [f"{self.base_url}/recorded/{name}" for name in sorted(os.listdir(self.record_dir))]
+        return urls
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve generated or recorded RSS/Atom feeds locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--feeds", type=int, default=3, help="Number of generated feeds.")
+    parser.add_argument("--items", type=int, default=50, help="Articles per generated feed.")
+    parser.add_argument("--format", choices=["rss", "atom"], default="rss", dest="feed_format")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every response is delayed.")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Extra random delay in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503.")
+    parser.add_argument("--change-rate", type=float, default=0.0,
+                        help="Chance that a feed gets a new article on each request.")
+    parser.add_argument("--no-304", action="store_true", help="Never answer conditional requests with 304.")
+    parser.add_argument("--record-dir", help="Directory of recorded feeds to serve under /recorded/.")
+    parser.add_argument("--record", nargs="+", metavar="URL", help="Record these feeds into --record-dir and exit.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.record:
+        record_feeds(args.record, args.record_dir or "recorded_feeds")
+        return
+
+    server = ReplayServer(args.feeds, args.items, args.feed_format, args.latency, args.latency_jitter,
+                          args.error_rate, args.change_rate, not args.no_304, args.record_dir,
+                          args.host, args.port, args.seed)
+    print(f"Serving {len(server.urls)} feeds on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
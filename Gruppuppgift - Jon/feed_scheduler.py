@@ -0,0 +1,336 @@
+"""
+feed_scheduler.py
+
+Long-running scheduler that polls every feed on its own adaptive interval,
+instead of fetching all feeds on every run.
+
+For each feed in RSS_URLS and in the 'rss feeds' list file it:
+  - learns how fast the feed publishes (new links per second, smoothed over polls)
+    and polls it often enough to pick up about TARGET_NEW_PER_POLL new articles per poll
+  - backs off on quiet feeds, and backs off exponentially on failing feeds
+  - adds random jitter to every interval, so feeds do not synchronize
+  - never runs more than MAX_REQUESTS_PER_HOST requests against one host at a time
+
+Polls are conditional (ETag / Last-Modified, see RssArticles_1.py), and new
+entries are handed to the streaming pipeline (pipeline.ingest_posts), which
+skips articles that are already stored. A feed's validator and its new links
+are only remembered once the handler has stored the entries; if it fails (or
+raises), the error is logged and the entries are handed over again on the
+next poll. Category counts are recounted at most once per STATE_SAVE_INTERVAL.
+
+Usage:
+    python feed_scheduler.py              # poll, classify and store until stopped
+    python feed_scheduler.py --dry-run    # only poll and report new entries
+"""
+
+import argparse
+import functools
+import heapq
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+
+from RssArticles_1 import RSS_URLS, FEED_TIMEOUT, fetch_feed, load_validators, save_validators
+
+# The extra list of feeds kept at the repository root
+RSS_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rss feeds")
+# Learned intervals and rates, so a restart does not start from scratch
+SCHEDULE_STATE_PATH = "feed_schedule.json"
+
+MIN_INTERVAL = 60            # Seconds; never poll a feed more often than this
+MAX_INTERVAL = 3600          # Seconds; never wait longer than this between polls
+INITIAL_INTERVAL = 300       # Seconds before the second poll of a feed we know nothing about
+TARGET_NEW_PER_POLL = 1.0    # Poll often enough to find about this many new articles per poll
+QUIET_BACKOFF = 1.5          # Interval multiplier after a poll without new articles
+FAILURE_BACKOFF = 2.0        # Base of the exponential backoff after failed polls
+RATE_SMOOTHING = 0.3         # Weight of the newest observation in the publish-rate estimate
+JITTER = 0.1                 # Intervals are randomized by +/- this fraction
+MAX_WORKERS = 16             # Polls running at the same time, over all hosts
+MAX_REQUESTS_PER_HOST = 2    # Polls running at the same time against one host
+STATE_SAVE_INTERVAL = 60     # Seconds between saves of validators and schedule state
+MAX_REMEMBERED_LINKS = 1000  # Links remembered per feed to recognize new entries
+
+
+def load_feed_urls(list_path=RSS_LIST_PATH):
+    """
+    Returns RSS_URLS followed by the feeds in the list file, without duplicates.
+    """
+    urls = list(RSS_URLS)
+    if os.path.exists(list_path):
+        with open(list_path, encoding="utf-8") as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(dict.fromkeys(urls))
+
+
+class FeedState:
+    """
+    What the scheduler has learned about one feed.
+    """
+
+    def __init__(self, url, interval=INITIAL_INTERVAL, rate=0.0, failures=0):
+        self.url = url
+        self.host = urlsplit(url).netloc
+        self.interval = interval
+        self.rate = rate            # Estimated new articles per second
+        self.failures = failures
+        self.last_poll = None       # time.monotonic() of the last successful poll
+        self.known_links = set()    # Links seen in earlier polls
+        self.handled_links = set()  # Links handed to the handler successfully
+
+    def to_dict(self):
+        return {"interval": self.interval, "rate": self.rate, "failures": self.failures}
+
+    def record_success(self, entries, now):
+        """
+        Updates the publish-rate estimate from a successful poll and picks the next interval.
+
+        Returns:
+            list: The entries whose links have not been handled yet (see mark_handled).
+        """
+        new_entries = [entry for entry in entries if entry.get("link") not in self.known_links]
+        if self.last_poll is not None:
+            elapsed = max(now - self.last_poll, 1.0)
+            observed_rate = len(new_entries) / elapsed
+            self.rate = RATE_SMOOTHING * observed_rate + (1 - RATE_SMOOTHING) * self.rate
+            if new_entries and self.rate > 0:
+                self.interval = TARGET_NEW_PER_POLL / self.rate
+            else:
+                self.interval *= QUIET_BACKOFF
+        self.interval = min(max(self.interval, MIN_INTERVAL), MAX_INTERVAL)
+        self.failures = 0
+        self.last_poll = now
+
+        self.known_links.update(entry.get("link") for entry in new_entries)
+        if len(self.known_links) > MAX_REMEMBERED_LINKS:
+            self.known_links = {entry.get("link") for entry in entries}
+        return [entry for entry in entries if entry.get("link") not in self.handled_links]
+
+    def mark_handled(self, handled, entries):
+        """
+        Remembers the links of entries the handler has stored, so they are not handed over again.
+        """
+        self.handled_links.update(entry.get("link") for entry in handled)
+        if len(self.handled_links) > MAX_REMEMBERED_LINKS:
+            self.handled_links = {entry.get("link") for entry in entries}
+
+    def record_failure(self):
+        """
+        Backs off exponentially after a failed poll.
+        """
+        self.failures += 1
+        self.interval = min(self.interval * FAILURE_BACKOFF, MAX_INTERVAL)
+
+    def next_delay(self, rng):
+        """
+        Seconds until the next poll, with jitter.
+        """
+        return self.interval * rng.uniform(1 - JITTER, 1 + JITTER)
+
+
+def load_schedule_state(urls, path=SCHEDULE_STATE_PATH):
+    """
+    Creates a FeedState for every URL, restoring learned intervals and rates from disk.
+    """
+    saved = {}
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read schedule state from {path}: {e}")
+    return {url: FeedState(url, **saved.get(url, {})) for url in urls}
+
+
+def save_schedule_state(states, path=SCHEDULE_STATE_PATH):
+    """
+    Saves the learned intervals and rates, replacing the old file atomically.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({url: state.to_dict() for url, state in states.items()}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def print_new_entries(url, entries):
+    """
+    Handler for --dry-run: reports new entries without storing them.
+    """
+    print(f"{len(entries)} new article(s) from {url}")
+    return True
+
+
+def store_new_entries(url, entries, seen_index, story_index):
+    """
+    Default handler: classifies and stores new entries with the streaming pipeline.
+
+    Returns:
+        bool: True if every batch was stored.
+    """
+    from pipeline import ingest_posts
+    stored, complete = ingest_posts(entries, seen_index=seen_index, story_index=story_index,
+                                    count_categories=False)
+    print(f"{len(entries)} new article(s) from {url}, {stored} stored")
+    return complete
+
+
+def recount_categories():
+    """
+    Updates the category counts in the database; errors are logged, not raised.
+    """
+    from DbTransfer_5 import db_connection, calculate_category_counts
+    try:
+        cnxn = db_connection()
+        if not cnxn:
+            print("No database connection established; category counts not updated.")
+            return False
+        try:
+            calculate_category_counts(cnxn)
+        finally:
+            cnxn.close()
+    except Exception as e:
+        print(f"Error updating category counts: {e}")
+        return False
+    return True
+
+
+def run(urls=None, on_new_entries=None, duration=None, seed=None, persist=True):
+    """
+    Polls the feeds on their adaptive schedules until stopped (or for `duration` seconds).
+
+    Args:
+        urls (list): Feeds to poll. Defaults to load_feed_urls().
+        on_new_entries (callable): Called as on_new_entries(url, entries) with the new entries of a poll;
+            returns True once they are stored. Otherwise (or if it raises) the feed's validator and
+            links are not remembered, so the entries are handed over again. Defaults to storing
+            them with the pipeline.
+        duration (float): Seconds to run, or None to run until interrupted.
+        seed (int): Random seed for the jitter.
+        persist (bool): Save feed validators and the learned schedule to disk. Turn off
+            for dry runs, so they do not hide entries from the next real run.
+
+    Returns:
+        dict: The FeedState of every feed.
+    """
+    rng = random.Random(seed)
+    urls = urls if urls is not None else load_feed_urls()
+    states = load_schedule_state(urls)
+    validators = load_validators()
+    seen_index = story_index = None
+    counts_stale = False  # Articles stored since the category counts were last updated
+    if on_new_entries is None:
+        from near_duplicates import StoryIndex
+        from seen_links import load_seen_index
+        seen_index = load_seen_index()
+        story_index = StoryIndex()
+        on_new_entries = functools.partial(store_new_entries, seen_index=seen_index, story_index=story_index)
+
+    # Heap of (next poll time, url); spread the first polls over a few seconds
+    start = time.monotonic()
+    queue = [(start + rng.uniform(0, 5), url) for url in urls]
+    heapq.heapify(queue)
+    in_flight = {}        # future -> url
+    per_host = {}         # host -> number of polls running
+    deferred = []         # Due polls waiting for a running poll of their host to finish
+    last_save = start
+    requests = 0
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+    def save_state():
+        nonlocal counts_stale
+        if persist:
+            save_validators(validators)
+            save_schedule_state(states)
+        if seen_index is not None:
+            seen_index.save()
+            story_index.save()
+            if counts_stale and recount_categories():
+                counts_stale = False
+
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            now = time.monotonic()
+
+            # Start every due poll whose host is below its concurrency cap
+            for item in deferred:
+                heapq.heappush(queue, item)
+            deferred = []
+            while queue and queue[0][0] <= now and len(in_flight) < MAX_WORKERS:
+                due, url = heapq.heappop(queue)
+                host = states[url].host
+                if per_host.get(host, 0) >= MAX_REQUESTS_PER_HOST:
+                    deferred.append((due, url))
+                    continue
+                per_host[host] = per_host.get(host, 0) + 1
+                in_flight[executor.submit(fetch_feed, url, FEED_TIMEOUT, validators.get(url))] = url
+                requests += 1
+
+            # Wait for a poll to finish or for the next poll to become due. Deferred polls, and
+            # due polls while every worker is busy, can only start once a running poll finishes
+            if queue and len(in_flight) < MAX_WORKERS:
+                timeout = max(queue[0][0] - time.monotonic(), 0)
+            else:
+                timeout = 1.0
+            if duration is not None:
+                timeout = min(timeout, max(start + duration - time.monotonic(), 0))
+            if in_flight:
+                done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(timeout)
+                done = set()
+
+            for future in done:
+                url = in_flight.pop(future)
+                state = states[url]
+                per_host[state.host] -= 1
+                try:
+                    entries, validator = future.result()
+                except Exception as e:
+                    state.record_failure()
+                    print(f"Error fetching {url}: {e} (retry in about {state.interval:.0f} s)")
+                else:
+                    new_entries = state.record_success(entries, time.monotonic())
+                    handled = True
+                    if new_entries:
+                        try:
+                            handled = on_new_entries(url, new_entries)
+                        except Exception as e:
+                            print(f"Error handling {len(new_entries)} new article(s) from {url}: {e}")
+                            handled = False
+                        counts_stale = counts_stale or bool(handled)
+                    if handled:
+                        # Only now may the next poll answer 304 or skip these links
+                        state.mark_handled(new_entries, entries)
+                        if validator:
+                            validators[url] = validator
+                        else:
+                            validators.pop(url, None)
+                heapq.heappush(queue, (time.monotonic() + state.next_delay(rng), url))
+
+            if time.monotonic() - last_save >= STATE_SAVE_INTERVAL:
+                save_state()
+                last_save = time.monotonic()
+    except KeyboardInterrupt:
+        print("Stopping scheduler.")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        save_state()
+        print(f"{requests} feed requests in {time.monotonic() - start:.0f} s")
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll RSS feeds on adaptive per-feed schedules.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report new entries; do not classify or store.")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds.")
+    args = parser.parse_args()
+    if args.dry_run:
+        run(on_new_entries=print_new_entries, duration=args.duration, persist=False)
+    else:
+        run(duration=args.duration)
+
+
+if __name__ == "__main__":
+    main()
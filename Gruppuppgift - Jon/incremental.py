@@ -0,0 +1,193 @@
+"""
+incremental.py
+
+Incremental training mode: learns newly annotated rows of Book1_2.csv in
+seconds instead of a full retrain.
+
+The feature space is the hashing backend (feature_backends.HashingTfidfVectorizer),
+which needs no vocabulary and updates its IDF weights batch by batch, and the
+model has one SGD logistic regression per category, which can be updated with
+partial_fit. Each run:
+  - reads the rows whose Id is higher than any row learned so far
+  - updates the vectorizer and the model with them, BATCH_SIZE rows at a time
+  - saves a checkpoint after every batch, so an interrupted run loses at most one batch
+  - publishes the updated model to the model registry, which load_model() serves;
+    a checkpoint that was saved but never published (an interrupted run) is
+    published by the next run even without new rows
+
+Metrics in the manifest: a full refit reports test_accuracy like
+MLModelMLC_3.train_and_publish, from a second model fitted on the training
+split only (the served model learns every row). Each new batch is scored
+before it is learned, and progressive_accuracy is the accuracy over all rows
+learned since the refit, on rows the model had not seen yet.
+
+A full refit on all rows (vectorizer, preprocessing artifact and model from
+scratch) only runs on request, or when there is no checkpoint yet.
+
+Usage:
+    python incremental.py                # learn new rows
+    python incremental.py --full-refit   # retrain on all rows
+"""
+
+import argparse
+import os
+import time
+
+import joblib
+from sklearn.metrics import accuracy_score
+from sklearn.pipeline import Pipeline
+
+import MLModelMLC_3
+import linear_scorer
+import model_registry
+import preprocessing
+from feature_backends import HashingTfidfVectorizer
+from linear_engine import IncrementalMultiLabelClassifier
+
+# Directory of the checkpoint and its preprocessing artifact
+INCREMENTAL_DIR = "incremental_model"
+CHECKPOINT_FILE = "checkpoint.pkl"
+BATCH_SIZE = 64      # Annotated rows per update
+
+
+def checkpoint_path():
+    return os.path.join(INCREMENTAL_DIR, CHECKPOINT_FILE)
+
+
+def save_checkpoint(state):
+    """
+    Saves the checkpoint (vectorizer, model, categories, last learned Id), replacing it atomically.
+    """
+    tmp_path = f"{checkpoint_path()}.tmp"
+    joblib.dump(state, tmp_path)
+    os.replace(tmp_path, checkpoint_path())
+
+
+def load_checkpoint():
+    if not os.path.exists(checkpoint_path()):
+        return None
+    return joblib.load(checkpoint_path())
+
+
+def build_vectorizer(tokenizer):
+    return HashingTfidfVectorizer(tokenizer, n_features=MLModelMLC_3.HASHING_N_FEATURES,
+                                  use_idf=MLModelMLC_3.HASHING_USE_IDF)
+
+
+def holdout_accuracy(data_raw, tokenizer):
+    """
+    Test accuracy of a refit on the training split of MLModelMLC_3.split_dataset, so it is
+    comparable with the accuracy of train_and_publish.
+    """
+    x_train_text, x_test_text, y_train, y_test = MLModelMLC_3.split_dataset(data_raw)
+    vectorizer = build_vectorizer(tokenizer)
+    model = IncrementalMultiLabelClassifier().fit(vectorizer.fit_transform(x_train_text), y_train)
+    return float(accuracy_score(y_test, model.predict(vectorizer.transform(x_test_text))))
+
+
+def full_refit(data_raw):
+    """
+    Trains the vectorizer, the preprocessing artifact and the model from scratch on all rows.
+    """
+    os.makedirs(INCREMENTAL_DIR, exist_ok=True)
+    texts = data_raw["Heading"]
+    tokenizer = preprocessing.save_artifact(texts, os.path.join(INCREMENTAL_DIR, preprocessing.PREPROCESSING_PATH))
+    vectorizer = build_vectorizer(tokenizer)
+    x = vectorizer.fit_transform(texts)
+    labels = data_raw.drop(labels=["Id", "Heading"], axis=1)
+    model = IncrementalMultiLabelClassifier().fit(x, labels)
+    metrics = {"test_accuracy": holdout_accuracy(data_raw, tokenizer)}
+    print("Test Accuracy:", metrics["test_accuracy"])
+    state = {"categories": list(labels.columns), "vectorizer": vectorizer, "model": model,
+             "last_id": int(data_raw["Id"].max()), "batches": 0, "metrics": metrics}
+    save_checkpoint(state)
+    print(f"Full refit on {len(data_raw)} rows.")
+    return state
+
+
+def learn_new_rows(state, data_raw):
+    """
+    Updates the checkpoint with the rows whose Id is higher than the last learned one.
+
+    Every batch is scored before it is learned (see progressive_accuracy).
+
+    Returns:
+        int: The number of rows learned.
+    """
+    new_rows = data_raw[data_raw["Id"] > state["last_id"]].sort_values("Id")
+    metrics = state.setdefault("metrics", {})
+    for start in range(0, len(new_rows), BATCH_SIZE):
+        batch = new_rows.iloc[start:start + BATCH_SIZE]
+        labels = batch[state["categories"]]
+        correct = accuracy_score(labels, state["model"].predict(state["vectorizer"].transform(batch["Heading"])),
+                                 normalize=False)
+        metrics["progressive_correct"] = int(metrics.get("progressive_correct", 0) + correct)
+        metrics["progressive_rows"] = metrics.get("progressive_rows", 0) + len(batch)
+        metrics["progressive_accuracy"] = metrics["progressive_correct"] / metrics["progressive_rows"]
+        state["vectorizer"].partial_fit(batch["Heading"])
+        x = state["vectorizer"].transform(batch["Heading"])
+        state["model"].partial_fit(x, labels)
+        state["last_id"] = int(batch["Id"].max())
+        state["batches"] += 1
+        state.pop("published", None)  # This checkpoint is not in the registry yet
+        save_checkpoint(state)
+    return len(new_rows)
+
+
+def publish(state, data_path, refit, training_time):
+    """
+    Publishes the checkpoint as a model version, so load_model() serves it, and records
+    in the checkpoint that it is published.
+    """
+    version = model_registry.training_key(data_path, {"mode": "incremental", "batches": state["batches"],
+                                                      "last_id": state["last_id"], "refit": refit},
+                                          MLModelMLC_3.CODE_PATHS + [os.path.abspath(__file__)])
+    vectorizer_path = os.path.join(INCREMENTAL_DIR, model_registry.VECTORIZER_FILE)
+    model_path = os.path.join(INCREMENTAL_DIR, model_registry.MODEL_FILE)
+    joblib.dump(state["vectorizer"], vectorizer_path)
+    best_clf_pipeline = Pipeline([('clf', state["model"])])
+    joblib.dump(best_clf_pipeline, model_path)
+    files = {
+        model_registry.VECTORIZER_FILE: vectorizer_path,
+        model_registry.MODEL_FILE: model_path,
+        model_registry.PREPROCESSING_FILE: os.path.join(INCREMENTAL_DIR, preprocessing.PREPROCESSING_PATH),
+    }
+    scorer_path = os.path.join(INCREMENTAL_DIR, linear_scorer.LINEAR_SCORER_DIR)
+    if linear_scorer.compile_if_supported(state["categories"], state["vectorizer"], best_clf_pipeline, scorer_path):
+        files[linear_scorer.LINEAR_SCORER_DIR] = scorer_path
+    model_registry.publish(version, files, {
+        "categories": state["categories"],
+        "config": {"mode": "incremental", "last_id": state["last_id"]},
+        "metrics": state.get("metrics", {}),
+        "training_time": training_time,
+    })
+    state["published"] = version
+    save_checkpoint(state)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the model with newly annotated rows.")
+    parser.add_argument("--full-refit", action="store_true", help="Retrain from scratch on all rows.")
+    parser.add_argument("--data", help="Annotated dataset (default: MLModelMLC_3.DATA_PATH).")
+    args = parser.parse_args()
+
+    data_path = args.data or MLModelMLC_3.DATA_PATH
+    data_raw = MLModelMLC_3.load_dataset(data_path)
+    start = time.perf_counter()
+    state = None if args.full_refit else load_checkpoint()
+    refit = state is None
+    if refit:
+        state = full_refit(data_raw)
+    else:
+        learned = learn_new_rows(state, data_raw)
+        print(f"Learned {learned} new row(s) in {state['batches']} batch(es) so far.")
+        if not learned and state.get("published"):
+            print(f"Model version {state['published']} is up to date.")
+            return
+    training_time = time.perf_counter() - start
+    print(f"Done in {training_time:.1f} s.")
+    publish(state, data_path, refit, training_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+linear_scorer.py
+
+Compiled scorer for linear models: the fitted vectorizer and classifier as a
+handful of arrays, scored with NumPy and SciPy only.
+
+For a linear model, best_clf_pipeline.predict_proba goes through the
+vectorizer, the Pipeline, OneVsRestClassifier and one estimator per category
+(each with its own input validation) for what is ten dot products per
+article. compile_model() folds it all into
+  - terms: the vocabulary, sorted; a term's position is its row in the weights
+  - weights: the coefficient matrix (terms x categories) with the IDF weights
+    folded in, and intercepts
+  - idf_squared: for the l2 norm of the TF-IDF row, which the scores are divided by
+  - calibration: a sigmoid for logistic models (LogisticRegression, SGD with
+    log loss), or libsvm's Platt scaling for SVC(kernel='linear', probability=True)
+
+LinearScorer counts the n-grams of a batch into one sparse matrix and scores
+it with a single sparse x dense product, so the cost per article is its
+tokenization plus a few microseconds.
+
+The scorer is stored as a directory (LINEAR_SCORER_DIR) with one plain .npy
+file per array and a meta.json, and loaded memory-mapped read-only: loading
+takes a millisecond, and every process that serves the model (Streamlit
+workers, pipeline workers) reads the same pages of the operating system's
+file cache instead of holding its own copy. The n-grams of a batch are looked
+up in the sorted terms with a binary search, so no per-process vocabulary
+dict is built either.
+
+MLModelMLC_3.train_and_publish and incremental.py compile every model they
+publish if it is supported (compile_if_supported), and the scorer is stored
+in the model's version directory.
+
+Usage:
+    python linear_scorer.py   # compile the served model and check it against sklearn
+"""
+
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import expit
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.svm import SVC
+
+import MLModelMLC_3
+import preprocessing
+
+LINEAR_SCORER_DIR = "linear_scorer"
+# Version of the directory layout; bump it when the layout changes
+FORMAT_VERSION = 1
+# Largest difference to sklearn's predict_proba accepted by main()
+TOLERANCE = 1e-6
+
+# libsvm's bounds for pairwise probabilities, and its stopping tolerance for two classes
+_MIN_PROB = 1e-7
+_COUPLING_EPS = 0.005 / 2
+_COUPLING_MAX_ITER = 100
+
+# Loaded scorers per model directory, filled in by load_scorer()
+_loaded = {}
+
+
+def _estimators(best_clf_pipeline):
+    clf = best_clf_pipeline.named_steps['clf'] if hasattr(best_clf_pipeline, 'named_steps') else best_clf_pipeline
+    if not hasattr(clf, "estimators_"):
+        raise ValueError(f"{type(clf).__name__} has no per-category estimators.")
+    return clf.estimators_
+
+
+def compile_model(categories, vectorizer, best_clf_pipeline):
+    """
+    Compiles a TF-IDF vectorizer and a per-category linear classifier into plain arrays.
+
+    Raises:
+        ValueError: If the vectorizer or one of the estimators is not supported (e.g. an rbf SVC).
+
+    Returns:
+        dict: The arrays and settings of the scorer, as saved by save_scorer().
+    """
+    if not isinstance(vectorizer, TfidfVectorizer) or not isinstance(vectorizer.tokenizer,
+                                                                    preprocessing.ArtifactTokenizer):
+        raise ValueError("Only a TfidfVectorizer with a preprocessing artifact tokenizer can be compiled.")
+    if vectorizer.analyzer != 'word' or vectorizer.binary or vectorizer.sublinear_tf or vectorizer.norm != 'l2':
+        raise ValueError("Only word n-grams with raw counts and l2 normalization can be compiled.")
+
+    n_terms = len(vectorizer.vocabulary_)
+    terms = np.array(sorted(vectorizer.vocabulary_))
+    # Vectorizer column of every sorted term, to reorder the rows of the weights
+    columns = np.array([vectorizer.vocabulary_[term] for term in terms.tolist()])
+    idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(n_terms)
+
+    estimators = _estimators(best_clf_pipeline)
+    coefficients = np.zeros((n_terms, len(estimators)))
+    intercepts = np.zeros(len(estimators))
+    constants = np.full(len(estimators), np.nan)
+    platt_a = np.zeros(len(estimators))
+    platt_b = np.zeros(len(estimators))
+    kinds = set()
+    for i, estimator in enumerate(estimators):
+        if not hasattr(estimator, "coef_"):
+            # OneVsRestClassifier's stand-in for a category with one class in the training data
+            constants[i] = float(estimator.predict_proba(sp.csr_matrix((1, n_terms)))[0, 1])
+            continue
+        if isinstance(estimator, SVC):
+            if estimator.kernel != 'linear' or not len(estimator._probA):
+                raise ValueError("Only SVC(kernel='linear', probability=True) can be compiled.")
+            kinds.add("platt")
+            platt_a[i], platt_b[i] = estimator._probA[0], estimator._probB[0]
+        elif isinstance(estimator, LogisticRegression) or (isinstance(estimator, SGDClassifier)
+                                                          and estimator.loss == "log_loss"):
+            kinds.add("sigmoid")
+        else:
+            raise ValueError(f"{type(estimator).__name__} cannot be compiled.")
+        coef = estimator.coef_
+        coefficients[:, i] = np.ravel(coef.toarray() if sp.issparse(coef) else coef)
+        intercepts[i] = estimator.intercept_[0]
+    if len(kinds) > 1:
+        raise ValueError("Estimators with different calibrations cannot be compiled together.")
+
+    tokenizer = vectorizer.tokenizer
+    return {
+        "terms": terms,
+        "weights": np.ascontiguousarray((coefficients * idf[:, None])[columns]),
+        "idf_squared": (idf ** 2)[columns],
+        "intercepts": intercepts,
+        "constants": constants,
+        "platt_a": platt_a,
+        "platt_b": platt_b,
+        "categories": list(categories),
+        "calibration": kinds.pop() if kinds else "sigmoid",
+        "ngram_range": list(vectorizer.ngram_range),
+        "tokenizer_path": os.path.basename(tokenizer.path),
+        "artifact_id": tokenizer.artifact_id,
+    }
+
+
+def save_scorer(compiled, path):
+    """
+    Saves a compiled scorer as a directory: the arrays as .npy files, the rest in meta.json.
+    The old directory is replaced in one step, so a reader never sees half a scorer.
+    """
+    tmp_dir = f"{path}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    meta = {"format_version": FORMAT_VERSION}
+    for name, value in compiled.items():
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), value)
+        else:
+            meta[name] = value
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_dir, path)
+    _loaded.pop(os.path.dirname(path) or ".", None)
+
+
+def compile_if_supported(categories, vectorizer, best_clf_pipeline, path):
+    """
+    Compiles a model and saves its scorer at `path`, unless the model is not supported.
+
+    Returns:
+        bool: True if the scorer was saved.
+    """
+    try:
+        compiled = compile_model(categories, vectorizer, best_clf_pipeline)
+    except ValueError as e:
+        print(f"No compiled scorer: {e}")
+        return False
+    save_scorer(compiled, path)
+    print(f"Compiled scorer saved to {path}.")
+    return True
+
+
+def _libsvm_probability(decision, platt_a, platt_b):
+    """
+    libsvm's probability of the positive class for two classes: Platt scaling of the
+    negative class, bounded and coupled with its iterative method, in array form.
+    """
+    # libsvm's decision value is the negated sklearn one, and its first class is the negative one
+    r = np.clip(expit(-(-decision * platt_a + platt_b)), _MIN_PROB, 1 - _MIN_PROB)
+    q00, q11, q01 = (1 - r) ** 2, r ** 2, -(1 - r) * r
+    p0, p1 = np.full_like(r, 0.5), np.full_like(r, 0.5)
+    active = np.ones(r.shape, dtype=bool)
+    for _ in range(_COUPLING_MAX_ITER):
+        qp0, qp1 = q00 * p0 + q01 * p1, q01 * p0 + q11 * p1
+        pqp = p0 * qp0 + p1 * qp1
+        active &= np.maximum(np.abs(qp0 - pqp), np.abs(qp1 - pqp)) >= _COUPLING_EPS
+        if not active.any():
+            break
+        # Update p0, then p1, as libsvm does
+        diff = np.where(active, (pqp - qp0) / q00, 0.0)
+        p0 = p0 + diff
+        pqp = (pqp + diff * (diff * q00 + 2 * qp0)) / (1 + diff) ** 2
+        qp0, qp1 = (qp0 + diff * q00) / (1 + diff), (qp1 + diff * q01) / (1 + diff)
+        p0, p1 = p0 / (1 + diff), p1 / (1 + diff)
+        diff = np.where(active, (pqp - qp1) / q11, 0.0)
+        p1 = p1 + diff
+        p0, p1 = p0 / (1 + diff), p1 / (1 + diff)
+    return p1
+
+
+class LinearScorer:
+    """
+    predict_proba of a compiled linear model, with texts as input.
+    """
+
+    def __init__(self, compiled, tokenizer):
+        self.categories = list(compiled["categories"])
+        self.terms = compiled["terms"]
+        self.weights = compiled["weights"]
+        self.idf_squared = compiled["idf_squared"]
+        self.intercepts = compiled["intercepts"]
+        self.constants = compiled["constants"]
+        self.calibration = compiled["calibration"]
+        self.platt_a = compiled["platt_a"]
+        self.platt_b = compiled["platt_b"]
+        self.min_n, self.max_n = compiled["ngram_range"]
+        self.tokenizer = tokenizer
+
+    def count(self, texts):
+        """
+        Counts the known n-grams of the texts, like the vectorizer before weighting.
+
+        Returns:
+            scipy.sparse.csr_matrix: Counts (texts x terms).
+        """
+        grams = []
+        lengths = []
+        for text in texts:
+            tokens = self.tokenizer(text)
+            start = len(grams)
+            for n in range(self.min_n, min(self.max_n, len(tokens)) + 1):
+                grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+            lengths.append(len(grams) - start)
+
+        # Binary search of every n-gram of the batch in the sorted terms
+        grams = np.array(grams, dtype=str)
+        positions = np.minimum(np.searchsorted(self.terms, grams), len(self.terms) - 1)
+        found = self.terms[positions] == grams
+        rows = np.repeat(np.arange(len(lengths)), lengths)[found]
+        return sp.csr_matrix((np.ones(len(rows)), (rows, positions[found])),
+                             shape=(len(lengths), len(self.terms)))
+
+    def decision_function(self, texts):
+        """
+        The decision values of every category (texts x categories).
+        """
+        counts = self.count(texts)
+        norms = np.sqrt(counts.multiply(counts) @ self.idf_squared)
+        scores = np.asarray(counts @ self.weights)
+        np.divide(scores, norms[:, None], out=scores, where=norms[:, None] > 0)
+        return scores + self.intercepts
+
+    def predict_proba(self, texts):
+        """
+        The probability of every category (texts x categories), as best_clf_pipeline.predict_proba.
+        """
+        decision = self.decision_function(texts)
+        if self.calibration == "platt":
+            probabilities = _libsvm_probability(decision, self.platt_a, self.platt_b)
+        else:
+            probabilities = expit(decision)
+        constant = ~np.isnan(self.constants)
+        probabilities[:, constant] = self.constants[constant]
+        return probabilities
+
+
+def read_scorer(path, mmap_mode="r"):
+    """
+    Reads a saved scorer, memory-mapped read-only by default.
+
+    Returns:
+        dict: The arrays and settings, as returned by compile_model().
+    """
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        compiled = json.load(f)
+    if compiled.pop("format_version") != FORMAT_VERSION:
+        raise ValueError(f"{path} has another format version; compile the model again.")
+    for name in os.listdir(path):
+        if name.endswith(".npy"):
+            compiled[name[:-4]] = np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+    return compiled
+
+
+def load_scorer(directory=None):
+    """
+    Returns the compiled scorer of the served model, or None if it has not been compiled.
+    It is loaded once per process.
+    """
+    directory = directory or MLModelMLC_3.model_dir()
+    if directory not in _loaded:
+        path = os.path.join(directory, LINEAR_SCORER_DIR)
+        scorer = None
+        if os.path.exists(os.path.join(path, "meta.json")):
+            compiled = read_scorer(path)
+            # The artifact is stored next to the scorer
+            with preprocessing.artifact_dir(directory):
+                tokenizer = preprocessing.load_tokenizer(compiled["tokenizer_path"], compiled["artifact_id"])
+            scorer = LinearScorer(compiled, tokenizer)
+        _loaded[directory] = scorer
+    return _loaded[directory]
+
+
+def main():
+    categories, vectorizer, best_clf_pipeline = MLModelMLC_3.load_model()
+    directory = MLModelMLC_3.model_dir()
+    path = os.path.join(directory, LINEAR_SCORER_DIR)
+    save_scorer(compile_model(categories, vectorizer, best_clf_pipeline), path)
+    start = time.perf_counter()
+    scorer = load_scorer(directory)
+    load_time = time.perf_counter() - start
+
+    _, texts, _, _ = MLModelMLC_3.split_dataset(MLModelMLC_3.load_dataset())
+    texts = list(texts)
+    # Warm up the stem tables of both tokenizers
+    best_clf_pipeline.predict_proba(vectorizer.transform(texts))
+    scorer.predict_proba(texts)
+    start = time.perf_counter()
+    expected = best_clf_pipeline.predict_proba(vectorizer.transform(texts))
+    sklearn_time = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = scorer.predict_proba(texts)
+    scorer_time = time.perf_counter() - start
+    difference = float(np.abs(actual - expected).max())
+
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    print(f"Compiled {len(scorer.terms)} terms x {len(categories)} categories "
+          f"({size / 1024:.0f} KB), loaded in {load_time * 1000:.1f} ms.")
+    print(f"{len(texts)} headlines: sklearn {sklearn_time / len(texts) * 1e6:.0f} us/article, "
+          f"compiled {scorer_time / len(texts) * 1e6:.0f} us/article")
+    print(f"Largest probability difference: {difference:.2e}")
+    if difference > TOLERANCE:
+        raise SystemExit(f"The compiled scorer differs from sklearn by more than {TOLERANCE}.")
+
+
+if __name__ == "__main__":
+    main()
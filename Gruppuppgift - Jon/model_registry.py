@@ -0,0 +1,192 @@
+"""
+model_registry.py
+
+Content-addressed registry of trained models.
+
+Every trained model is stored as a version in its own directory under
+REGISTRY_DIR, named after a hash of everything that went into it: the dataset
+file, the training code and the training configuration. A version holds the
+vectorizer, the model, the preprocessing artifact, the compiled scorer if the
+model has one (see linear_scorer.py) and a manifest.json with the categories,
+the configuration, test metrics and training time.
+
+The file CURRENT names the version that load_model() serves. It is replaced
+atomically, so a reader sees either the old or the new version, never a mix,
+and a rollback is one pointer update. Only the newest KEEP_VERSIONS versions
+are kept (the current one is never deleted).
+
+Usage:
+    python model_registry.py list                 # versions, newest first
+    python model_registry.py rollback <version>   # serve an older version
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+
+import joblib
+
+import preprocessing
+
+# Directory of the registry
+REGISTRY_DIR = "model_registry"
+# Number of versions kept
+KEEP_VERSIONS = 5
+
+# Files of a version (the names they are stored under)
+VECTORIZER_FILE = "vectorizer.pkl"
+MODEL_FILE = "best_clf_pipeline.pkl"
+PREPROCESSING_FILE = "preprocessing.json"
+MANIFEST_FILE = "manifest.json"
+
+
+def training_key(data_path, config, code_paths):
+    """
+    Hash of the dataset file, the training code and the configuration: the version of a model.
+
+    Args:
+        data_path (str): The dataset CSV.
+        config (dict): Training settings (JSON-serializable).
+        code_paths (list): Source files whose changes should retrain the model.
+
+    Returns:
+        str: A 16-character hex version.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+    for path in [data_path] + sorted(code_paths):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def version_dir(version, registry_dir=REGISTRY_DIR):
+    return os.path.join(registry_dir, version)
+
+
+def has_version(version, registry_dir=REGISTRY_DIR):
+    return os.path.exists(os.path.join(version_dir(version, registry_dir), MANIFEST_FILE))
+
+
+def current_version(registry_dir=REGISTRY_DIR):
+    """
+    Returns the version named by CURRENT, or None if nothing is published yet.
+    """
+    try:
+        with open(os.path.join(registry_dir, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current(version, registry_dir=REGISTRY_DIR):
+    """
+    Points CURRENT at a stored version, replacing the pointer atomically.
+    """
+    if not has_version(version, registry_dir):
+        raise ValueError(f"Model version {version} is not in the registry.")
+    tmp_path = os.path.join(registry_dir, "CURRENT.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(registry_dir, "CURRENT"))
+
+
+def read_manifest(version, registry_dir=REGISTRY_DIR):
+    with open(os.path.join(version_dir(version, registry_dir), MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def publish(version, files, manifest, registry_dir=REGISTRY_DIR):
+    """
+    Stores the files of a trained model as a version and makes it current.
+
+    Args:
+        version (str): The training key of the model.
+        files (dict): Stored file name -> path of the file (or directory) to copy.
+        manifest (dict): Categories, configuration, metrics and training time.
+    """
+    target_dir = version_dir(version, registry_dir)
+    tmp_dir = f"{target_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, path in files.items():
+        if os.path.isdir(path):
+            shutil.copytree(path, os.path.join(tmp_dir, name))
+        else:
+            shutil.copy2(path, os.path.join(tmp_dir, name))
+    manifest = dict(manifest, version=version, files=sorted(files),
+                    created=datetime.datetime.now().isoformat(timespec="seconds"))
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.replace(tmp_dir, target_dir)
+    set_current(version, registry_dir)
+    print(f"Model version {version} published.")
+    _prune(registry_dir)
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """
+    Returns the manifests of all stored versions, newest first.
+    """
+    if not os.path.isdir(registry_dir):
+        return []
+    manifests = [read_manifest(name, registry_dir) for name in os.listdir(registry_dir)
+                 if has_version(name, registry_dir)]
+    return sorted(manifests, key=lambda manifest: manifest["created"], reverse=True)
+
+
+def _prune(registry_dir):
+    current = current_version(registry_dir)
+    for manifest in list_versions(registry_dir)[KEEP_VERSIONS:]:
+        if manifest["version"] != current:
+            shutil.rmtree(version_dir(manifest["version"], registry_dir), ignore_errors=True)
+
+
+def load_version(version, registry_dir=REGISTRY_DIR, mmap_mode=None):
+    """
+    Loads a stored version.
+
+    Args:
+        mmap_mode (str): "r" memory-maps the NumPy arrays in the pickles read-only
+            (see MLModelMLC_3.MMAP_MODE); None reads them into memory.
+
+    Returns:
+        tuple: categories, vectorizer, best_clf_pipeline
+    """
+    directory = version_dir(version, registry_dir)
+    manifest = read_manifest(version, registry_dir)
+    # The vectorizer refers to its preprocessing artifact by a relative path
+    with preprocessing.artifact_dir(directory):
+        vectorizer = joblib.load(os.path.join(directory, VECTORIZER_FILE), mmap_mode=mmap_mode)
+    best_clf_pipeline = joblib.load(os.path.join(directory, MODEL_FILE), mmap_mode=mmap_mode)
+    return manifest["categories"], vectorizer, best_clf_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List model versions or roll back to one.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List stored versions, newest first.")
+    rollback = subparsers.add_parser("rollback", help="Serve a stored version.")
+    rollback.add_argument("version")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_version()
+        for manifest in list_versions():
+            marker = "*" if manifest["version"] == current else " "
+            print(f"{marker} {manifest['version']}  {manifest['created']}  "
+                  f"test accuracy {manifest.get('metrics', {}).get('test_accuracy')}  "
+                  f"trained in {manifest.get('training_time', 0):.0f} s")
+    else:
+        set_current(args.version)
+        print(f"Now serving model version {args.version}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+near_duplicates.py
+
+Groups near-duplicate articles from different sources into stories.
+
+DN, SVT and Aftonbladet often publish the same story under different links.
+Every article is turned into a set of shingles (pairs of consecutive stems
+from the model's tokenizer), summarized by a MinHash signature, and looked up in
+an LSH index (banded signatures). An article whose estimated Jaccard
+similarity to an earlier article reaches SIMILARITY_THRESHOLD joins that
+article's story; otherwise it starts a new story.
+
+Only one article per story is classified; the other copies reuse its
+categories. The story ID is stored with every article, so the dashboard can
+collapse duplicates with one set lookup per article. A re-fetched article
+keeps its story unless its title or summary changed; then it is matched
+again and the categories of its old story are dropped, so they are
+classified from the new content. Stored categories belong to the model
+version that assigned them (see use_model) and are dropped when another
+version is served.
+"""
+
+import hashlib
+import os
+import zlib
+
+import joblib
+import numpy as np
+
+import preprocessing
+from seen_links import content_hash
+
+# Path to the persisted index
+STORY_INDEX_PATH = "story_index.pkl"
+
+NUM_PERMUTATIONS = 64        # MinHash signature length
+BANDS = 16                   # LSH bands; rows per band = NUM_PERMUTATIONS // BANDS
+SIMILARITY_THRESHOLD = 0.5   # Estimated Jaccard similarity needed to join a story
+MAX_STORIES = 50_000         # Oldest stories are forgotten beyond this many signatures
+
+# Permutations are simulated by universal hashes ((a * x + b) mod p) truncated to 32 bits;
+# the products may wrap around in uint64, which only mixes them further
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(6)
+_HASH_A = _rng.randint(1, _PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+_HASH_B = _rng.randint(0, _PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def shingles(text):
+    """
+    Returns the set of word 2-shingles of a text (single stems if it has only one).
+    """
+    tokens = preprocessing.get_tokenizer()(text)
+    if len(tokens) < 2:
+        return set(tokens)
+    return {f"{first} {second}" for first, second in zip(tokens, tokens[1:])}
+
+
+def minhash(shingle_set):
+    """
+    Computes the MinHash signature of a set of shingles.
+
+    Returns:
+        numpy.ndarray: NUM_PERMUTATIONS unsigned integers, or None for an empty set.
+    """
+    if not shingle_set:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingle_set), dtype=np.uint64,
+                         count=len(shingle_set))
+    with np.errstate(over="ignore"):
+        permuted = ((np.outer(_HASH_A, hashes) + _HASH_B[:, None]) % _PRIME) & _MAX_HASH
+    return permuted.min(axis=1)
+
+
+def new_story_id(link, contents):
+    """
+    Derives a story ID (positive 63-bit integer) from the link and the content hash of the
+    story's first article, so an article whose content changed starts a story with a new ID.
+    """
+    digest = hashlib.blake2b(f"{link}\n{contents}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+class StoryIndex:
+    """
+    LSH index from MinHash bands to stories, plus the categories of each classified story.
+    """
+
+    def __init__(self, path=STORY_INDEX_PATH):
+        self.path = path
+        self.signatures = {}    # story_id -> signature of the story's first article
+        self.buckets = {}       # (band, band bytes) -> list of story_ids
+        self.categories = {}    # story_id -> categories of the story
+        self.link_stories = {}  # link -> story_id, so a re-fetched article keeps its story
+        self.link_contents = {}  # link -> content hash of the article when it was assigned
+        self.model_version = None  # Model version that assigned the categories
+        if path and os.path.exists(path):
+            state = joblib.load(path)
+            self.signatures, self.categories, self.link_stories = state[:3]
+            if len(state) > 3:
+                self.link_contents = state[3]
+            if len(state) > 4:
+                self.model_version = state[4]
+            self._rebuild_buckets()
+
+    def use_model(self, version):
+        """
+        Drops the stored categories if they were assigned by another model version.
+        """
+        if version != self.model_version:
+            self.categories = {}
+            self.model_version = version
+
+    def _band_keys(self, signature):
+        rows = NUM_PERMUTATIONS // BANDS
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+
+    def _rebuild_buckets(self):
+        self.buckets = {}
+        for story_id, signature in self.signatures.items():
+            for key in self._band_keys(signature):
+                self.buckets.setdefault(key, []).append(story_id)
+
+    def assign(self, article):
+        """
+        Returns the story ID of an Article record, creating a new story if it matches none.
+
+        A known link keeps its story while its title and summary are unchanged.
+        """
+        contents = content_hash(article.title, article.summary)
+        if article.link in self.link_stories:
+            story_id = self.link_stories[article.link]
+            old_contents = self.link_contents.setdefault(article.link, contents)
+            if old_contents == contents:
+                return story_id
+            self._forget_article(article.link, old_contents, story_id)
+        self.link_contents[article.link] = contents
+
+        signature = minhash(shingles(f"{article.title} {article.summary}"))
+        story_id = None
+        if signature is not None:
+            keys = self._band_keys(signature)
+            best_similarity = SIMILARITY_THRESHOLD
+            for candidate in {sid for key in keys for sid in self.buckets.get(key, ())}:
+                similarity = float(np.mean(self.signatures[candidate] == signature))
+                if similarity >= best_similarity:
+                    story_id, best_similarity = candidate, similarity
+
+        if story_id is None:
+            story_id = new_story_id(article.link, contents)
+            if signature is not None:
+                self.signatures[story_id] = signature
+                for key in keys:
+                    self.buckets.setdefault(key, []).append(story_id)
+                if len(self.signatures) > MAX_STORIES:
+                    self._forget_oldest()
+        self.link_stories[article.link] = story_id
+        return story_id
+
+    def _forget_article(self, link, old_contents, story_id):
+        """
+        Detaches an article whose content changed from its story and drops the story's categories.
+
+        A story founded by the article loses its signature too, since it was computed from the old content.
+        """
+        del self.link_stories[link]
+        self.categories.pop(story_id, None)
+        if story_id == new_story_id(link, old_contents) and story_id in self.signatures:
+            for key in self._band_keys(self.signatures.pop(story_id)):
+                self.buckets[key].remove(story_id)
+
+    def _forget_oldest(self):
+        """
+        Drops the oldest half of the stories (dicts keep insertion order).
+        """
+        evicted = set(list(self.signatures)[:len(self.signatures) // 2])
+        self.signatures = {sid: signature for sid, signature in self.signatures.items() if sid not in evicted}
+        self.categories = {sid: cats for sid, cats in self.categories.items() if sid not in evicted}
+        self.link_stories = {link: sid for link, sid in self.link_stories.items() if sid not in evicted}
+        self.link_contents = {link: h for link, h in self.link_contents.items() if link in self.link_stories}
+        self._rebuild_buckets()
+
+    def save(self):
+        """
+        Writes the index to disk, replacing the old file atomically.
+        """
+        tmp_path = f"{self.path}.tmp"
+        joblib.dump((self.signatures, self.categories, self.link_stories, self.link_contents, self.model_version),
+                    tmp_path)
+        os.replace(tmp_path, self.path)
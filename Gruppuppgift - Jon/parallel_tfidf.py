@@ -0,0 +1,270 @@
+"""
+parallel_tfidf.py
+
+Fits and applies the TF-IDF vectorizer on all CPU cores.
+
+TfidfVectorizer tokenizes every document in one process, and the custom Python
+tokenizer dominates its run time. This engine splits the documents into
+contiguous shards and counts n-grams in a process pool:
+
+  - fit: every worker counts its shard with its own vocabulary; the shard
+    vocabularies are merged into one sorted vocabulary, the count matrices are
+    re-indexed and stacked, min_df/max_df/max_features are applied to the
+    merged counts, and the IDF weights are computed from the merged document
+    frequencies.
+  - transform: every worker counts its shard against the fitted vocabulary
+    (sent once per worker), and the stacked counts are weighted and normalized.
+
+The fitted vectorizer is an ordinary TfidfVectorizer (vocabulary_ and idf_
+are set on it), and the matrices are the same CSR matrices TfidfVectorizer
+itself returns. Small inputs, and vectorizers of other backends (see
+feature_backends.py), are vectorized in-process.
+
+Usage:
+    python parallel_tfidf.py    # checks the engine against TfidfVectorizer on the dataset
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+# Number of worker processes; None uses every CPU core
+N_JOBS = None
+# Inputs with fewer documents per worker than this are vectorized in-process
+MIN_SHARD_SIZE = 500
+# Shards per worker, so a slow shard does not leave the other workers idle
+SHARDS_PER_WORKER = 4
+
+# Count settings that only make sense for the whole corpus; they are applied after merging
+_CORPUS_PARAMS = ("min_df", "max_df", "max_features", "vocabulary")
+
+# Set in each worker process by _init_worker
+_worker_counter = None
+
+
+def _count_params(vectorizer):
+    """
+    The CountVectorizer settings of a TfidfVectorizer that apply per document.
+    """
+    count_keys = CountVectorizer().get_params()
+    return {key: value for key, value in vectorizer.get_params().items()
+            if key in count_keys and key not in _CORPUS_PARAMS}
+
+
+def _init_worker(params, vocabulary):
+    global _worker_counter
+    _worker_counter = CountVectorizer(vocabulary=vocabulary, **params)
+
+
+def _count_shard(documents):
+    """
+    Counts one shard against the fixed vocabulary, or with the shard's own vocabulary.
+
+    Without a fixed vocabulary the shard's terms are returned in order of first
+    appearance, and each row's columns are sorted in that order, as in
+    CountVectorizer before it sorts the vocabulary.
+    """
+    if _worker_counter.vocabulary is not None:
+        return None, _worker_counter.transform(documents)
+
+    analyze = _worker_counter.build_analyzer()
+    vocabulary = {}
+    indices, values, indptr = [], [], [0]
+    for doc in documents:
+        feature_counter = {}
+        for feature in analyze(doc):
+            feature_idx = vocabulary.setdefault(feature, len(vocabulary))
+            feature_counter[feature_idx] = feature_counter.get(feature_idx, 0) + 1
+        indices.extend(feature_counter.keys())
+        values.extend(feature_counter.values())
+        indptr.append(len(indices))
+    counts = sp.csr_matrix((np.array(values, dtype=np.intc), np.array(indices, dtype=np.int64),
+                            np.array(indptr, dtype=np.int64)),
+                           shape=(len(documents), len(vocabulary)), dtype=_worker_counter.dtype)
+    return list(vocabulary), counts
+
+
+def _shards(documents, n_jobs):
+    n_shards = min(n_jobs * SHARDS_PER_WORKER, max(len(documents) // MIN_SHARD_SIZE, 1))
+    bounds = np.linspace(0, len(documents), n_shards + 1).astype(int)
+    return [documents[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _resolve_n_jobs(n_jobs):
+    n_jobs = n_jobs if n_jobs is not None else N_JOBS
+    return n_jobs if n_jobs is not None and n_jobs > 0 else (os.cpu_count() or 1)
+
+
+def _map_shards(documents, params, vocabulary, n_jobs):
+    """
+    Counts the shards in a process pool. Returns a list of (vocabulary, counts) in document order.
+    """
+    shards = _shards(documents, n_jobs)
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(shards)), initializer=_init_worker,
+                             initargs=(params, vocabulary)) as executor:
+        return list(executor.map(_count_shard, shards))
+
+
+def _merge_counts(shard_results):
+    """
+    Merges per-shard terms and count matrices into one sorted vocabulary and matrix.
+
+    Columns are first numbered by first appearance in the whole corpus and sorted
+    within each row, then renumbered alphabetically, exactly as CountVectorizer
+    does. The order of columns within a row decides the summation order of the
+    L2 norm, so this keeps the TF-IDF values identical to the last bit.
+    """
+    first_seen = {}
+    for terms, _ in shard_results:
+        for term in terms:
+            first_seen.setdefault(term, len(first_seen))
+    vocabulary = {term: index for index, term in enumerate(sorted(first_seen))}
+    alphabetical = np.empty(len(first_seen), dtype=np.int64)
+    for term, rank in first_seen.items():
+        alphabetical[rank] = vocabulary[term]
+
+    matrices = []
+    for terms, counts in shard_results:
+        ranks = np.fromiter((first_seen[term] for term in terms), dtype=np.int64, count=len(terms))
+        matrices.append(sp.csr_matrix((counts.data, ranks[counts.indices], counts.indptr),
+                                      shape=(counts.shape[0], len(first_seen))))
+    merged = sp.vstack(matrices, format="csr")
+    merged.sort_indices()
+    merged.indices = alphabetical[merged.indices]
+    if merged.nnz <= np.iinfo(np.int32).max:
+        merged.indices = merged.indices.astype(np.int32)
+        merged.indptr = merged.indptr.astype(np.int32)
+    return vocabulary, merged
+
+
+def _limit_features(counts, vocabulary, vectorizer):
+    """
+    Applies max_df, min_df and max_features to the merged counts, the way CountVectorizer does.
+    """
+    n_docs = counts.shape[0]
+    max_df, min_df, max_features = vectorizer.max_df, vectorizer.min_df, vectorizer.max_features
+    max_doc_count = max_df if isinstance(max_df, (int, np.integer)) else max_df * n_docs
+    min_doc_count = min_df if isinstance(min_df, (int, np.integer)) else min_df * n_docs
+    if max_doc_count < min_doc_count:
+        raise ValueError("max_df corresponds to < documents than min_df")
+    if max_doc_count >= n_docs and min_doc_count <= 1 and max_features is None:
+        return counts, vocabulary
+
+    dfs = np.bincount(counts.indices, minlength=counts.shape[1])
+    mask = (dfs <= max_doc_count) & (dfs >= min_doc_count)
+    if max_features is not None and mask.sum() > max_features:
+        tfs = np.asarray(counts.sum(axis=0)).ravel()
+        mask_inds = (-tfs[mask]).argsort()[:max_features]
+        new_mask = np.zeros(len(dfs), dtype=bool)
+        new_mask[np.where(mask)[0][mask_inds]] = True
+        mask = new_mask
+    kept_indices = np.where(mask)[0]
+    if len(kept_indices) == 0:
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+    new_indices = np.cumsum(mask) - 1
+    vocabulary = {term: int(new_indices[index]) for term, index in vocabulary.items() if mask[index]}
+    return counts[:, kept_indices], vocabulary
+
+
+def _tfidf_transformer(vectorizer):
+    return TfidfTransformer(norm=vectorizer.norm, use_idf=vectorizer.use_idf,
+                            smooth_idf=vectorizer.smooth_idf, sublinear_tf=vectorizer.sublinear_tf)
+
+
+def fit_transform(vectorizer, documents, n_jobs=None):
+    """
+    Fits an unfitted TfidfVectorizer on the documents and returns their TF-IDF matrix.
+
+    Args:
+        vectorizer (TfidfVectorizer): The vectorizer to fit (in place).
+        documents (iterable): The raw texts.
+        n_jobs (int): Worker processes. Defaults to N_JOBS (every core).
+
+    Returns:
+        scipy.sparse.csr_matrix: The same matrix as vectorizer.fit_transform(documents).
+    """
+    documents = list(documents)
+    n_jobs = _resolve_n_jobs(n_jobs)
+    if (not isinstance(vectorizer, TfidfVectorizer) or vectorizer.vocabulary is not None
+            or n_jobs == 1 or len(documents) < 2 * MIN_SHARD_SIZE):
+        return vectorizer.fit_transform(documents)
+
+    vocabulary, counts = _merge_counts(_map_shards(documents, _count_params(vectorizer), None, n_jobs))
+    counts, vocabulary = _limit_features(counts, vocabulary, vectorizer)
+    counts = counts.astype(vectorizer.dtype, copy=False)
+
+    tfidf = _tfidf_transformer(vectorizer).fit(counts)
+    vectorizer.vocabulary_ = vocabulary
+    vectorizer.fixed_vocabulary_ = False
+    if vectorizer.use_idf:
+        vectorizer.idf_ = tfidf.idf_
+    return tfidf.transform(counts, copy=False)
+
+
+def fit(vectorizer, documents, n_jobs=None):
+    """
+    Fits an unfitted TfidfVectorizer on the documents in parallel. Returns the vectorizer.
+    """
+    fit_transform(vectorizer, documents, n_jobs)
+    return vectorizer
+
+
+def transform(vectorizer, documents, n_jobs=None):
+    """
+    Returns the TF-IDF matrix of the documents, counted in parallel with a fitted vectorizer.
+    """
+    documents = list(documents)
+    n_jobs = _resolve_n_jobs(n_jobs)
+    if not isinstance(vectorizer, TfidfVectorizer) or n_jobs == 1 or len(documents) < 2 * MIN_SHARD_SIZE:
+        return vectorizer.transform(documents)
+
+    params = dict(_count_params(vectorizer), dtype=vectorizer.dtype)
+    shard_results = _map_shards(documents, params, vectorizer.vocabulary_, n_jobs)
+    counts = sp.vstack([shard_counts for _, shard_counts in shard_results], format="csr")
+    tfidf = _tfidf_transformer(vectorizer)
+    if vectorizer.use_idf:
+        tfidf.idf_ = vectorizer.idf_
+    return tfidf.transform(counts, copy=False)
+
+
+def _same_matrix(a, b):
+    return a.shape == b.shape and (a != b).nnz == 0
+
+
+def main():
+    """
+    Vectorizes the dataset with TfidfVectorizer and with the engine, and compares results and times.
+    """
+    import MLModelMLC_3
+
+    headings = list(MLModelMLC_3.load_dataset()["Heading"])
+    # Repeat the headings, so there is enough work to shard
+    documents = headings * max(1, 20_000 // len(headings))
+    n_jobs = _resolve_n_jobs(None)
+    print(f"{len(documents)} documents, {n_jobs} worker process(es)")
+
+    start = time.perf_counter()
+    expected_vectorizer = MLModelMLC_3.build_vectorizer()
+    expected = expected_vectorizer.fit_transform(documents)
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorizer = MLModelMLC_3.build_vectorizer()
+    actual = fit_transform(vectorizer, documents, n_jobs)
+    parallel_time = time.perf_counter() - start
+
+    same = (vectorizer.vocabulary_ == expected_vectorizer.vocabulary_
+            and np.array_equal(vectorizer.idf_, expected_vectorizer.idf_)
+            and _same_matrix(actual, expected)
+            and _same_matrix(transform(vectorizer, documents, n_jobs), expected_vectorizer.transform(documents)))
+    print(f"Identical to TfidfVectorizer: {same}")
+    print(f"fit_transform: {serial_time:.2f} s serial, {parallel_time:.2f} s parallel "
+          f"({serial_time / parallel_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
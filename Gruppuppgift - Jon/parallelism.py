@@ -0,0 +1,86 @@
+"""
+parallelism.py
+
+One CPU budget for training and inference.
+
+Training has three levels of parallelism that multiply:
+  - search workers: the processes of GridSearchCV / HalvingGridSearchCV (n_jobs)
+  - label jobs: the per-category estimators of OneVsRestClassifier (n_jobs),
+    run as threads inside each search worker
+  - BLAS threads: the OpenBLAS/MKL/OpenMP threads of NumPy and SciPy inside
+    every worker
+
+Left alone, n_jobs=-1 starts one search worker per core and every worker
+starts one BLAS thread per core, so a 32-core machine runs 32 x 32 threads
+and spends its time switching between them. plan() divides the cores so that
+search_jobs * label_jobs * blas_threads never exceeds them, and limits()
+applies the BLAS cap with threadpoolctl in this process and, through joblib,
+in every worker process. Serving processes cap their BLAS threads once, with
+cap_blas(), since the cap is process-global and not safe to enter and leave
+from several threads.
+
+Levels that are not set explicitly are filled in the order search workers,
+label jobs, BLAS threads: cross-validation folds and candidates are
+independent, so the outermost level scales best.
+"""
+
+from contextlib import contextmanager
+
+from joblib import cpu_count, parallel_config
+from threadpoolctl import threadpool_limits
+
+
+def plan(n_cores=None, search_jobs=None, label_jobs=None, blas_threads=None):
+    """
+    Divides the cores between search workers, label jobs and BLAS threads.
+
+    Args:
+        n_cores (int): Cores to use. None: every core available to this process.
+        search_jobs (int): Search worker processes, or None to fill in.
+        label_jobs (int): Per-category estimator threads per worker, or None to fill in.
+        blas_threads (int): BLAS threads per worker, or None to fill in.
+
+    Returns:
+        dict: n_cores, search_jobs, label_jobs and blas_threads, all at least 1.
+    """
+    n_cores = n_cores or cpu_count()
+    fixed = (search_jobs or 1) * (label_jobs or 1) * (blas_threads or 1)
+    if fixed > n_cores:
+        raise ValueError(f"search_jobs={search_jobs}, label_jobs={label_jobs} and blas_threads={blas_threads} "
+                         f"need {fixed} cores, but only {n_cores} are available.")
+    if search_jobs is None:
+        search_jobs = max(n_cores // ((label_jobs or 1) * (blas_threads or 1)), 1)
+    if label_jobs is None:
+        label_jobs = max(n_cores // (search_jobs * (blas_threads or 1)), 1)
+    if blas_threads is None:
+        blas_threads = max(n_cores // (search_jobs * label_jobs), 1)
+    return {"n_cores": n_cores, "search_jobs": search_jobs, "label_jobs": label_jobs,
+            "blas_threads": blas_threads}
+
+
+def cap_blas(blas_threads):
+    """
+    Caps the BLAS/OpenMP threads of this process for the rest of its life.
+
+    Args:
+        blas_threads (int): Threads per process, or None for no cap.
+    """
+    if blas_threads is not None:
+        threadpool_limits(limits=blas_threads)
+
+
+@contextmanager
+def limits(blas_threads):
+    """
+    Caps the BLAS/OpenMP threads of this process and of joblib worker processes while the block runs.
+
+    Args:
+        blas_threads (int): Threads per process, or None for no cap.
+    """
+    if blas_threads is None:
+        yield
+        return
+    # loky is joblib's default process backend, used by the searches
+    with threadpool_limits(limits=blas_threads), parallel_config(backend="loky",
+                                                                 inner_max_num_threads=blas_threads):
+        yield
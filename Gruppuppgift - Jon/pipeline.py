@@ -0,0 +1,292 @@
+"""
+pipeline.py
+
+Explicit runner for the news pipeline. The pipeline is split into four stages,
+each a plain function that only runs when it is called:
+
+  1. fetch      - download the RSS feeds (RssArticles_1.py)
+  2. normalize  - extract fields and format dates (FullRSSList_1_2.py)
+  3. classify   - predict categories with the trained model (MLModelReturns_4.py)
+  4. store      - insert the articles into MySQL (DbTransfer_5.py)
+
+The modules behind each stage are imported inside the stage, so running one
+stage does not load the others. Every stage is timed. Articles that are
+already stored with the same title and summary (see seen_links.py) are
+dropped before classification, and near-duplicate copies of the same story
+are classified only once (see near_duplicates.py).
+
+run_streaming() moves the articles through the same stages in micro-batches
+instead: feeds are processed as soon as they arrive, and each batch is
+committed to the database before the next one is built. Memory is bounded by
+one batch plus at most RssArticles_1.MAX_WORKERS parsed feeds, however many
+feeds are fetched.
+
+Usage:
+    python pipeline.py                                  # run all stages
+    python pipeline.py --stages fetch normalize --output articles.json
+    python pipeline.py --stages classify store --input articles.json
+    python pipeline.py --stream --batch-size 64         # streaming mode
+"""
+
+import argparse
+import itertools
+import json
+import time
+
+from article import Article
+
+# Number of articles per micro-batch in streaming mode
+BATCH_SIZE = 64
+
+
+def fetch(urls=None):
+    """
+    Stage 1: Fetches the RSS feeds.
+
+    Args:
+        urls (list): RSS feed URLs. Defaults to RssArticles_1.RSS_URLS.
+
+    Returns:
+        list: All RSS feed entries.
+    """
+    from RssArticles_1 import RSS_URLS, fetch_rss_feeds
+    return fetch_rss_feeds(urls if urls is not None else RSS_URLS)
+
+
+def normalize(posts):
+    """
+    Stage 2: Extracts title, summary, link and published from the entries and formats the dates.
+
+    Returns:
+        list: The final list of Article records.
+    """
+    from FullRSSList_1_2 import build_final_list
+    return build_final_list(posts)
+
+
+def classify(final_list):
+    """
+    Stage 3: Classifies the new or changed articles and returns the validated Article records.
+    """
+    from MLModelReturns_4 import main as classify_main
+    from near_duplicates import StoryIndex
+    from seen_links import load_seen_index
+    changed = load_seen_index().filter_changed(final_list)
+    print(f"Skipping {len(final_list) - len(changed)} already stored articles.")
+    story_index = StoryIndex()
+    valid_dict = classify_main(changed, story_index)
+    story_index.save()
+    return valid_dict
+
+
+def store(valid_dict):
+    """
+    Stage 4: Inserts or updates the classified articles in the database and marks them as seen.
+
+    Once they are stored, the feed validators of the fetch are committed, so
+    unchanged feeds answer 304 on the next poll.
+    """
+    from DbTransfer_5 import main as store_main
+    from RssArticles_1 import commit_pending_validators
+    from seen_links import load_seen_index
+    if store_main(valid_dict):
+        index = load_seen_index()
+        index.mark(valid_dict)
+        index.save()
+        commit_pending_validators()
+    return valid_dict
+
+
+STAGES = {
+    "fetch": fetch,
+    "normalize": normalize,
+    "classify": classify,
+    "store": store,
+}
+
+
+def run(stages=tuple(STAGES), data=None):
+    """
+    Runs the given stages in pipeline order, passing each stage's output to the next one.
+
+    Args:
+        stages (iterable): Names of the stages to run; they must be consecutive.
+        data: Input for the first stage. Not needed when the first stage is 'fetch'.
+
+    Returns:
+        tuple: The output of the last stage and a dict of seconds spent in each stage.
+    """
+    order = list(STAGES)
+    selected = sorted(stages, key=order.index)
+    positions = [order.index(name) for name in selected]
+    if positions != list(range(positions[0], positions[0] + len(positions))):
+        raise ValueError(f"Stages must be consecutive, got: {', '.join(selected)}")
+
+    timings = {}
+    for name in selected:
+        start = time.perf_counter()
+        data = STAGES[name]() if name == "fetch" else STAGES[name](data)
+        timings[name] = time.perf_counter() - start
+        print(f"Stage '{name}' finished in {timings[name]:.2f} s")
+    return data, timings
+
+
+def iter_posts(urls=None, fetched=None):
+    """
+    Yields RSS entries one at a time, feed by feed, as soon as each feed has been parsed.
+
+    Args:
+        urls (list): RSS feed URLs. Defaults to RssArticles_1.RSS_URLS.
+        fetched (dict): If given, the new validator of each feed is added to it (by URL)
+            once all of the feed's entries have been yielded; see ingest_posts().
+    """
+    from RssArticles_1 import RSS_URLS, iter_rss_feeds, load_validators
+    validators = load_validators()
+    for url, entries, validator in iter_rss_feeds(urls if urls is not None else RSS_URLS, validators=validators):
+        yield from entries
+        if fetched is not None:
+            fetched[url] = validator
+
+
+def iter_batches(items, batch_size=BATCH_SIZE):
+    """
+    Groups an iterable into lists of at most batch_size items.
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_classified_batches(posts, batch_size=BATCH_SIZE, seen_index=None, story_index=None):
+    """
+    Normalizes and classifies posts in micro-batches.
+
+    Articles that the seen-link index reports as unchanged are dropped before classification,
+    and with a story index only one article per story is classified.
+
+    Yields:
+        list: The validated Article records of one batch.
+    """
+    from FullRSSList_1_2 import build_final_list
+    from MLModelReturns_4 import classify_final_list
+    for batch in iter_batches(posts, batch_size):
+        final_list = build_final_list(batch)
+        if seen_index is not None:
+            final_list = seen_index.filter_changed(final_list)
+        classified = classify_final_list(final_list, story_index)
+        if classified:
+            yield classified
+
+
+def ingest_posts(posts, batch_size=BATCH_SIZE, seen_index=None, story_index=None, fetched=None,
+                 count_categories=True):
+    """
+    Normalizes, classifies and stores posts in micro-batches over one database connection.
+
+    Each batch is committed on its own and then marked in the seen-link index (if given).
+
+    Args:
+        fetched (dict): Filled by iter_posts() with the validators of the feeds whose entries
+            have all been read from `posts`. They are committed once those entries are stored.
+            After a failed batch nothing more is committed, so the feeds are downloaded again.
+        count_categories (bool): Recount the articles per category afterwards. Callers that
+            ingest often (feed_scheduler.py) recount on their own schedule instead.
+
+    Returns:
+        tuple: The number of articles stored, and whether every batch was stored.
+    """
+    from DbTransfer_5 import db_connection, insert_data, calculate_category_counts
+    from RssArticles_1 import commit_validators
+    cnxn = db_connection()
+    if not cnxn:
+        print("No database connection established.")
+        return 0, False
+
+    stored = 0
+    failed = False
+    try:
+        for batch in iter_classified_batches(posts, batch_size, seen_index, story_index):
+            if insert_data(batch, cnxn):
+                if seen_index is not None:
+                    seen_index.mark(batch)
+                stored += len(batch)
+            else:
+                failed = True
+            # Every entry of these feeds is in this batch or an earlier one
+            if fetched and not failed:
+                commit_validators(fetched)
+                fetched.clear()
+        if fetched and not failed:
+            commit_validators(fetched)
+            fetched.clear()
+        if count_categories:
+            calculate_category_counts(cnxn)
+    finally:
+        cnxn.close()
+    return stored, not failed
+
+
+def run_streaming(urls=None, batch_size=BATCH_SIZE):
+    """
+    Runs fetch -> normalize -> classify -> store as a stream of micro-batches.
+
+    Each batch is inserted and committed on its own, so the first rows are in the
+    database while later feeds are still being downloaded.
+
+    Returns:
+        int: The number of articles stored.
+    """
+    from near_duplicates import StoryIndex
+    from seen_links import load_seen_index
+    seen_index = load_seen_index()
+    story_index = StoryIndex()
+    fetched = {}
+
+    start = time.perf_counter()
+    try:
+        stored, _ = ingest_posts(iter_posts(urls, fetched), batch_size, seen_index, story_index, fetched)
+    finally:
+        seen_index.save()
+        story_index.save()
+    print(f"Streamed {stored} articles in {time.perf_counter() - start:.2f} s")
+    return stored
+
+
+def main():
+    """
+    Parses the command line and runs the selected stages.
+    """
+    parser = argparse.ArgumentParser(description="Run the news pipeline or some of its stages.")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="Consecutive stages to run (default: all).")
+    parser.add_argument("--input", help="JSON file with the input for the first stage.")
+    parser.add_argument("--output", help="JSON file to write the output of the last stage to.")
+    parser.add_argument("--stream", action="store_true", help="Run all stages as a stream of micro-batches.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Articles per micro-batch when streaming.")
+    args = parser.parse_args()
+
+    if args.stream:
+        run_streaming(batch_size=args.batch_size)
+        return
+
+    data = None
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            data = json.load(f)
+        if args.stages[0] in ("classify", "store"):
+            # Articles are written as JSON arrays in Article field order
+            data = [Article(*row) for row in data]
+
+    data, timings = run(args.stages, data)
+    print(f"Total pipeline time: {sum(timings.values()):.2f} s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+preprocessing.py
+
+The fitted preprocessing of the model as a self-contained, versioned artifact.
+
+A vectorizer pickled with tokenizer_utils.custom_tokenizer imports NLTK when
+it is loaded, may download the stopword list and builds a SnowballStemmer
+before the first prediction. Instead, training saves everything the tokenizer
+needs in one JSON file (PREPROCESSING_PATH):
+  - the cleanup pattern and the stopword list
+  - a stem table with every token seen in the training texts
+  - the rules of the Swedish Snowball stemmer (vowels, s-endings and suffix
+    lists), so tokens that are not in the table are stemmed the same way
+    without NLTK
+
+ArtifactTokenizer tokenizes from that file and gives the same tokens as
+custom_tokenizer. A pickled ArtifactTokenizer only stores the artifact path
+and ID, so loading the vectorizer reads the artifact and nothing else.
+"""
+
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Path to the preprocessing artifact, next to the cached vectorizer
+PREPROCESSING_PATH = "preprocessing.json"
+# Version of the artifact format; bump it when the tokenizer changes
+FORMAT_VERSION = 1
+# Maximum number of tokens outside the stem table whose stems are cached (as in tokenizer_utils)
+STEM_CACHE_SIZE = 100_000
+
+# Rules of the Swedish Snowball stemmer, as in NLTK's SwedishStemmer
+# (https://snowballstem.org/algorithms/swedish/stemmer.html)
+SWEDISH_STEMMER_RULES = {
+    "vowels": "aeiouyäåö",
+    "s_ending": "bcdfghjklmnoprtvy",
+    "step1_suffixes": ["heterna", "hetens", "heter", "heten", "anden", "arnas", "ernas", "ornas", "andes",
+                       "andet", "arens", "arna", "erna", "orna", "ande", "arne", "aste", "aren", "ades",
+                       "erns", "ade", "are", "ern", "ens", "het", "ast", "ad", "en", "ar", "er", "or",
+                       "as", "es", "at", "a", "e", "s"],
+    "step2_suffixes": ["dd", "gd", "nn", "dt", "gt", "kt", "tt"],
+    "step3_suffixes": ["fullt", "löst", "els", "lig", "ig"],
+}
+
+_cached_tokenizers = {}
+# Directory that relative artifact paths are resolved in while unpickling (see artifact_dir)
+_artifact_dir = None
+
+
+def _r1(word, vowels):
+    """
+    Region R1 of the Scandinavian Snowball stemmers: after the first non-vowel that
+    follows a vowel, with at least three letters before it.
+    """
+    for i in range(1, len(word)):
+        if word[i] not in vowels and word[i - 1] in vowels:
+            return word[3:] if i + 1 < 3 else word[i + 1:]
+    return ""
+
+
+class SwedishStemmer:
+    """
+    The Swedish Snowball stemmer, driven by the rules stored in the artifact.
+    """
+
+    def __init__(self, rules):
+        self.vowels = rules["vowels"]
+        self.s_ending = rules["s_ending"]
+        self.step1_suffixes = rules["step1_suffixes"]
+        self.step2_suffixes = rules["step2_suffixes"]
+        self.step3_suffixes = rules["step3_suffixes"]
+
+    def stem(self, word):
+        r1 = _r1(word, self.vowels)
+
+        for suffix in self.step1_suffixes:
+            if r1.endswith(suffix):
+                if suffix == "s":
+                    if word[-2] in self.s_ending:
+                        word, r1 = word[:-1], r1[:-1]
+                else:
+                    word, r1 = word[:-len(suffix)], r1[:-len(suffix)]
+                break
+
+        for suffix in self.step2_suffixes:
+            if r1.endswith(suffix):
+                word, r1 = word[:-1], r1[:-1]
+                break
+
+        for suffix in self.step3_suffixes:
+            if r1.endswith(suffix):
+                if suffix in ("els", "lig", "ig"):
+                    word = word[:-len(suffix)]
+                elif suffix in ("fullt", "löst"):
+                    word = word[:-1]
+                break
+        return word
+
+
+class ArtifactTokenizer:
+    """
+    Tokenizer that reproduces custom_tokenizer from a preprocessing artifact.
+    """
+
+    def __init__(self, artifact, path=PREPROCESSING_PATH):
+        import re
+        self.path = path
+        self.artifact_id = artifact["artifact_id"]
+        self.pattern = re.compile(artifact["pattern"])
+        self.stop_words = frozenset(artifact["stop_words"])
+        self.stems = dict(artifact["stems"])
+        self.stemmer = SwedishStemmer(artifact["stemmer"])
+        # Tokens outside the table share a bounded LRU cache, so a long-running process does not grow
+        self._stem_unknown = lru_cache(maxsize=STEM_CACHE_SIZE)(self.stemmer.stem)
+
+    def _stem(self, token):
+        stem = self.stems.get(token)
+        if stem is None:
+            stem = self._stem_unknown(token)
+        return stem
+
+    def __call__(self, text):
+        if not isinstance(text, str):
+            text = str(text)
+        tokens = self.pattern.sub('', text.lower()).split()
+        return [self._stem(token) for token in tokens if token not in self.stop_words]
+
+    def __reduce__(self):
+        # Pickle a reference to the artifact, not the tables
+        return (load_tokenizer, (self.path, self.artifact_id))
+
+
+def build_artifact(texts):
+    """
+    Builds the artifact for a training corpus. Needs NLTK (via tokenizer_utils) for the stem table;
+    the stemmer rules are SWEDISH_STEMMER_RULES.
+
+    Returns:
+        dict: The artifact, with a stem for every token in the texts.
+    """
+    import tokenizer_utils
+
+    stems = {}
+    for text in texts:
+        if not isinstance(text, str):
+            text = str(text)
+        for token in tokenizer_utils._CLEANUP_PATTERN.sub('', text.lower()).split():
+            if token not in tokenizer_utils.stop_words and token not in stems:
+                stems[token] = tokenizer_utils._stem(token)
+
+    artifact = {
+        "format_version": FORMAT_VERSION,
+        "pattern": tokenizer_utils._CLEANUP_PATTERN.pattern,
+        "stop_words": sorted(tokenizer_utils.stop_words),
+        "stemmer": SWEDISH_STEMMER_RULES,
+        "stems": dict(sorted(stems.items())),
+    }
+    content = json.dumps(artifact, ensure_ascii=False, sort_keys=True)
+    artifact["artifact_id"] = hashlib.blake2b(content.encode("utf-8"), digest_size=8).hexdigest()
+    return artifact
+
+
+def save_artifact(texts, path=PREPROCESSING_PATH):
+    """
+    Builds the artifact for the training texts and saves it, replacing the old file atomically.
+
+    Returns:
+        ArtifactTokenizer: A tokenizer for the saved artifact, to set on the vectorizer before pickling it.
+    """
+    artifact = build_artifact(texts)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    print(f"Preprocessing artifact {artifact['artifact_id']} saved with {len(artifact['stems'])} stems.")
+    tokenizer = _cached_tokenizers[(path, artifact["artifact_id"])] = ArtifactTokenizer(artifact, path)
+    return tokenizer
+
+
+def load_tokenizer(path=PREPROCESSING_PATH, artifact_id=None):
+    """
+    Loads the tokenizer of an artifact (once per process).
+
+    Args:
+        path (str): Path to the artifact.
+        artifact_id (str): The ID the caller was fitted with; a different artifact is an error.
+
+    Returns:
+        ArtifactTokenizer: The tokenizer.
+    """
+    if _artifact_dir is not None and not os.path.isabs(path):
+        path = os.path.join(_artifact_dir, os.path.basename(path))
+    key = (path, artifact_id)
+    if key not in _cached_tokenizers:
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+        if artifact.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {artifact.get('format_version')}, "
+                             f"expected {FORMAT_VERSION}; retrain the model.")
+        if artifact_id is not None and artifact["artifact_id"] != artifact_id:
+            raise ValueError(f"{path} is artifact {artifact['artifact_id']}, but the vectorizer was "
+                             f"fitted with {artifact_id}; retrain the model.")
+        _cached_tokenizers[key] = ArtifactTokenizer(artifact, path)
+    return _cached_tokenizers[key]
+
+
+@contextmanager
+def artifact_dir(directory):
+    """
+    Resolves relative artifact paths in `directory` while the block runs, e.g. to
+    unpickle a vectorizer stored together with its artifact in the model registry.
+    """
+    global _artifact_dir
+    previous, _artifact_dir = _artifact_dir, directory
+    try:
+        yield
+    finally:
+        _artifact_dir = previous
+
+
+def get_tokenizer(path=PREPROCESSING_PATH):
+    """
+    Returns the artifact tokenizer if an artifact exists, otherwise custom_tokenizer.
+    """
+    if os.path.exists(path):
+        return load_tokenizer(path)
+    from tokenizer_utils import custom_tokenizer
+    return custom_tokenizer
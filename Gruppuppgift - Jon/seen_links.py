@@ -0,0 +1,125 @@
+"""
+seen_links.py
+
+Local index of the articles that are already stored in the `news` table.
+
+For every stored link the index keeps a hash of the article's title and summary.
+The pipeline checks new articles against it before classification: an article
+whose link is known and whose title and summary are unchanged skips
+tokenization, inference and the database round trip. New links and articles
+whose content changed are classified and stored as usual.
+
+The index is saved as a JSON file of short hashes and can be warmed from the
+database with warm_from_db(), e.g. the first time the pipeline runs.
+"""
+
+import hashlib
+import json
+import os
+
+# Path to the on-disk index
+SEEN_INDEX_PATH = "seen_links.json"
+
+
+def _short_hash(text):
+    """
+    Returns a 16-character hex digest of a string.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def content_hash(title, summary):
+    """
+    Hash of an article's title and summary, used to detect changed content.
+    """
+    return _short_hash(f"{title}\n{summary}")
+
+
+class SeenLinkIndex:
+    """
+    Maps the hash of each stored link to the content hash of its title and summary.
+    """
+
+    def __init__(self, path=SEEN_INDEX_PATH):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read seen-link index from {path}: {e}")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_unchanged(self, title, summary, link):
+        """
+        True if the link is already stored with the same title and summary.
+        """
+        return self.entries.get(_short_hash(link)) == content_hash(title, summary)
+
+    def filter_changed(self, final_list):
+        """
+        Keeps only the Article records that are new or have changed.
+        """
+        return [article for article in final_list
+                if not self.is_unchanged(article.title, article.summary, article.link)]
+
+    def mark(self, articles):
+        """
+        Records stored Article records as seen.
+        """
+        for article in articles:
+            self.entries[_short_hash(article.link)] = content_hash(article.title, article.summary)
+
+    def warm_from_db(self, cnxn):
+        """
+        Fills the index with every article in the `news` table.
+        """
+        cursor = cnxn.cursor()
+        try:
+            cursor.execute("SELECT title, summary, link FROM news")
+            for title, summary, link in cursor:
+                self.entries[_short_hash(link)] = content_hash(title, summary)
+        finally:
+            cursor.close()
+        print(f"Seen-link index warmed with {len(self.entries)} articles from the database.")
+
+    def save(self):
+        """
+        Writes the index to disk, replacing the old file atomically.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+def load_seen_index(path=SEEN_INDEX_PATH):
+    """
+    Loads the index, warming it from the database the first time it is used.
+    """
+    index = SeenLinkIndex(path)
+    if not os.path.exists(path):
+        from DbTransfer_5 import db_connection
+        cnxn = db_connection()
+        if cnxn:
+            try:
+                index.warm_from_db(cnxn)
+            finally:
+                cnxn.close()
+            index.save()
+    return index
+
+
+if __name__ == "__main__":
+    # Rebuild the index from the database
+    from DbTransfer_5 import db_connection
+    cnxn = db_connection()
+    if cnxn:
+        index = SeenLinkIndex(SEEN_INDEX_PATH)
+        index.entries = {}
+        index.warm_from_db(cnxn)
+        index.save()
+        cnxn.close()
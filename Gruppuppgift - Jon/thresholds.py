@@ -0,0 +1,255 @@
+"""
+thresholds.py
+
+Per-category classification thresholds, tuned on cached validation probabilities.
+
+MLModelReturns_4 assigns a category when its probability reaches THRESHOLD
+(one value for every category) and falls back to the most probable category
+when none does. This tool:
+  - computes out-of-fold probabilities on the rows the served model was trained
+    on: CV_FOLDS copies of its classifier (same hyperparameters) are each fitted
+    without one fold and predict it. The test split is not used for tuning.
+  - caches them (VALIDATION_CACHE_FILE, keyed by a hash of the model file),
+    together with the served model's probabilities on the test split
+  - searches one threshold per category on THRESHOLD_GRID that maximizes the
+    micro or macro F1 of the final predictions, fallback included
+  - reports the F1 of the tuned thresholds on the test split, which neither
+    the model nor the tuning has seen (a model of incremental.py learns every
+    row, so it has no test split and only the out-of-fold F1 is reported)
+  - saves the thresholds (THRESHOLDS_FILE) next to the model, in its version
+    directory of the model registry, where classify_articles loads them
+
+The search works on the whole probability matrix at once: for one category
+it scores every grid value in a single NumPy expression, and it updates the
+categories in turn (coordinate ascent) until no threshold changes. Tuning
+takes milliseconds and never runs the model again.
+
+Usage:
+    python thresholds.py [--metric micro|macro] [--refresh]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import KFold, cross_val_predict
+
+import MLModelMLC_3
+import model_registry
+
+THRESHOLDS_FILE = "thresholds.json"
+VALIDATION_CACHE_FILE = "validation_probabilities.npz"
+# Candidate thresholds per category
+THRESHOLD_GRID = np.round(np.arange(0.01, 0.96, 0.01), 2)
+# Passes over the categories at most; the search usually settles after two or three
+MAX_ROUNDS = 10
+# Folds of the out-of-fold probabilities the thresholds are tuned on
+CV_FOLDS = 3
+
+# Loaded thresholds per model directory, filled in by load_thresholds()
+_loaded = {}
+
+
+def _model_key(directory):
+    digest = hashlib.blake2b(digest_size=16)
+    model_path = os.path.join(directory, model_registry.MODEL_FILE if directory != "." else MLModelMLC_3.MODEL_PATH)
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _learned_every_row(directory):
+    """
+    True if the model in `directory` was trained on the whole dataset (see incremental.py).
+    """
+    path = os.path.join(directory, model_registry.MANIFEST_FILE)
+    if not os.path.exists(path):
+        return False
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("config", {}).get("mode") == "incremental"
+
+
+def validation_probabilities(refresh=False):
+    """
+    Returns out-of-fold probabilities on the training rows of the served model, and
+    its probabilities on the test split.
+
+    The result is cached next to the model and only recomputed when the model file changed.
+
+    Returns:
+        tuple: categories, probabilities (documents x categories), labels (0/1, same shape),
+            test_probabilities, test_labels (no rows if the model learned the test split too)
+    """
+    categories, vectorizer, best_clf_pipeline = MLModelMLC_3.load_model()
+    directory = MLModelMLC_3.model_dir()
+    cache_path = os.path.join(directory, VALIDATION_CACHE_FILE)
+    model_key = f"{_model_key(directory)}-{CV_FOLDS}"
+    if not refresh and os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if str(cached["model_key"]) == model_key:
+            return (categories, cached["probabilities"], cached["labels"],
+                    cached["test_probabilities"], cached["test_labels"])
+
+    data_raw = MLModelMLC_3.load_dataset()
+    if _learned_every_row(directory):
+        x_train_text, y_train = data_raw["Heading"], data_raw[categories]
+        test_probabilities = np.empty((0, len(categories)))
+        test_labels = np.empty((0, len(categories)), dtype=bool)
+    else:
+        x_train_text, x_test_text, y_train, y_test = MLModelMLC_3.split_dataset(data_raw)
+        test_probabilities = best_clf_pipeline.predict_proba(vectorizer.transform(x_test_text))
+        test_labels = y_test[categories].to_numpy().astype(bool)
+    labels = y_train[categories].to_numpy().astype(bool)
+    folds = KFold(CV_FOLDS, shuffle=True, random_state=MLModelMLC_3.SPLIT_SEED)
+    probabilities = cross_val_predict(clone(best_clf_pipeline), vectorizer.transform(x_train_text),
+                                      labels.astype(int), cv=folds, method="predict_proba")
+    tmp_path = f"{cache_path}.tmp.npz"
+    np.savez(tmp_path, model_key=model_key, probabilities=probabilities, labels=labels,
+             test_probabilities=test_probabilities, test_labels=test_labels)
+    os.replace(tmp_path, cache_path)
+    print(f"Out-of-fold probabilities of {len(labels)} headlines cached.")
+    return categories, probabilities, labels, test_probabilities, test_labels
+
+
+def predict(probabilities, thresholds):
+    """
+    The 0/1 predictions of classify_articles: every category at or above its threshold,
+    or the most probable category when none is.
+
+    Works on stacked candidates too: probabilities (..., documents, categories) and thresholds
+    broadcastable to it.
+    """
+    selected = probabilities >= thresholds
+    best = probabilities.argmax(axis=-1)[..., None] == np.arange(probabilities.shape[-1])
+    return selected | (best & ~selected.any(axis=-1, keepdims=True))
+
+
+def f1_scores(predictions, labels, metric="micro"):
+    """
+    F1 of predictions (..., documents, categories) against labels (documents, categories).
+
+    Returns:
+        numpy.ndarray: One score per leading index (a float for a single prediction matrix).
+    """
+    true_positives = (predictions & labels).sum(axis=-2)
+    predicted = predictions.sum(axis=-2)
+    actual = labels.sum(axis=-2)
+    if metric == "micro":
+        true_positives, predicted, actual = true_positives.sum(-1), predicted.sum(-1), actual.sum(-1)
+    elif metric != "macro":
+        raise ValueError(f"Unknown metric: {metric!r}")
+    denominator = predicted + actual
+    scores = np.divide(2 * true_positives, denominator, out=np.zeros(np.shape(denominator)),
+                       where=denominator > 0)
+    return scores.mean(-1) if metric == "macro" else scores
+
+
+def tune(probabilities, labels, metric="micro", grid=THRESHOLD_GRID):
+    """
+    Searches one threshold per category that maximizes the F1 of predict().
+
+    Returns:
+        tuple: thresholds (one per category), best score
+    """
+    # Start from the best threshold of each category on its own
+    per_category = probabilities[None] >= grid[:, None, None]
+    true_positives = (per_category & labels).sum(axis=1)
+    denominator = per_category.sum(axis=1) + labels.sum(axis=0)
+    thresholds = grid[np.argmax(2 * true_positives / np.maximum(denominator, 1), axis=0)]
+    best_score = f1_scores(predict(probabilities, thresholds), labels, metric)
+
+    for _ in range(MAX_ROUNDS):
+        changed = False
+        for category in range(probabilities.shape[1]):
+            # Row t: the current thresholds with this category's replaced by grid[t]
+            candidates = np.repeat(thresholds[None], len(grid), axis=0)
+            candidates[:, category] = grid
+            scores = f1_scores(predict(probabilities[None], candidates[:, None, :]), labels, metric)
+            best = int(np.argmax(scores))
+            if scores[best] > best_score:
+                thresholds, best_score, changed = candidates[best], scores[best], True
+        if not changed:
+            break
+    return thresholds, float(best_score)
+
+
+def save_thresholds(categories, thresholds, metric, score, directory=None, test_score=None):
+    """
+    Saves the thresholds next to the served model, replacing the old file atomically.
+
+    Args:
+        score (float): F1 on the out-of-fold probabilities the thresholds were tuned on.
+        test_score (float): F1 on the test split, or None if the model has none.
+    """
+    path = os.path.join(directory or MLModelMLC_3.model_dir(), THRESHOLDS_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"metric": metric, "score": score, "test_score": test_score,
+                   "thresholds": {category: float(threshold) for category, threshold in zip(categories, thresholds)}},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    _loaded.pop(os.path.dirname(path), None)
+    print(f"Thresholds saved to {path}.")
+
+
+def load_thresholds(categories, default, directory=None):
+    """
+    Returns the tuned thresholds of the served model in the order of `categories`.
+
+    Categories without a tuned threshold, or every category if the model has
+    not been tuned, get `default`. The file is read once per process.
+
+    Args:
+        directory (str): The model's directory. Defaults to MLModelMLC_3.model_dir().
+
+    Returns:
+        numpy.ndarray: One threshold per category.
+    """
+    directory = directory or MLModelMLC_3.model_dir()
+    if directory not in _loaded:
+        path = os.path.join(directory, THRESHOLDS_FILE)
+        tuned = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                tuned = json.load(f)["thresholds"]
+        _loaded[directory] = tuned
+    tuned = _loaded[directory]
+    return np.array([tuned.get(category, default) for category in categories])
+
+
+def main():
+    from MLModelReturns_4 import THRESHOLD
+
+    parser = argparse.ArgumentParser(description="Tune per-category thresholds of the served model.")
+    parser.add_argument("--metric", choices=["micro", "macro"], default="micro", help="F1 to maximize.")
+    parser.add_argument("--refresh", action="store_true", help="Recompute the cached validation probabilities.")
+    args = parser.parse_args()
+
+    categories, probabilities, labels, test_probabilities, test_labels = validation_probabilities(args.refresh)
+    baseline = f1_scores(predict(probabilities, THRESHOLD), labels, args.metric)
+    start = time.perf_counter()
+    thresholds, score = tune(probabilities, labels, args.metric)
+    tuning_time = time.perf_counter() - start
+
+    print(f"{args.metric} F1 out of fold on {len(labels)} headlines: {baseline:.3f} with THRESHOLD = {THRESHOLD}, "
+          f"{score:.3f} tuned (in {tuning_time * 1000:.0f} ms)")
+    test_score = None
+    if len(test_labels):
+        test_baseline = f1_scores(predict(test_probabilities, THRESHOLD), test_labels, args.metric)
+        test_score = float(f1_scores(predict(test_probabilities, thresholds), test_labels, args.metric))
+        print(f"{args.metric} F1 on {len(test_labels)} held-out test headlines: {test_baseline:.3f} "
+              f"with THRESHOLD = {THRESHOLD}, {test_score:.3f} tuned")
+    else:
+        print("The model learned every row, so there is no held-out test F1.")
+    for category, threshold in zip(categories, thresholds):
+        print(f"  {category:<20} {threshold:.2f}")
+    save_thresholds(categories, thresholds, args.metric, score, test_score=test_score)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,24 @@
+"""
+tokenizer_utils.py
+
+The tokenizer shared by the vectorizer, the classifier and the story index.
+
+custom_tokenizer is the fast path: one precompiled pattern removes HTML tags,
+punctuation and digits in a single pass, and stems come from a bounded LRU
+cache, since news vocabulary repeats heavily. reference_tokenizer is the
+original implementation; both return the same tokens.
+
+Run this file to verify that against the headings in Book1.csv and to see
+the speedup and the stem-cache hit rate:
+    python tokenizer_utils.py [path/to/Book1.csv]
+"""
+
+import os
 import re
+import sys
+import time
+from functools import lru_cache
+
 import nltk
 from nltk.corpus import stopwords
 from nltk.stem.snowball import SnowballStemmer
@@ -12,7 +32,32 @@ except LookupError:
 stop_words = set(stopwords.words('swedish'))
 stemmer = SnowballStemmer("swedish")
 
+# Maximum number of distinct tokens whose stems are cached
+STEM_CACHE_SIZE = 100_000
+HEADINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Book1.csv")
+
+# HTML tags, punctuation and digits, removed in one pass. Scanning left to right,
+# a '<' is first tried as the start of a tag, just like the first re.sub of the
+# reference tokenizer, so the result is the same as three passes in order.
+_CLEANUP_PATTERN = re.compile(r'<.*?>|[^\w\s]|\d+')
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def _stem(token):
+    return stemmer.stem(token)
+
+
 def custom_tokenizer(text):
+    if not isinstance(text, str):
+        text = str(text)
+    tokens = _CLEANUP_PATTERN.sub('', text.lower()).split()
+    return [_stem(token) for token in tokens if token not in stop_words]
+
+
+def reference_tokenizer(text):
+    """
+    The original tokenizer (three re.sub passes, no stem cache), kept for verification.
+    """
     if not isinstance(text, str):
         text = str(text)
     text = text.lower()
@@ -22,3 +67,48 @@ def custom_tokenizer(text):
     tokens = text.split()
     tokens = [stemmer.stem(token) for token in tokens if token not in stop_words]
     return tokens
+
+
+def stem_cache_report():
+    """
+    Returns a one-line summary of the stem cache: hits, misses, hit rate and size.
+    """
+    info = _stem.cache_info()
+    lookups = info.hits + info.misses
+    hit_rate = info.hits / lookups if lookups else 0.0
+    return (f"Stem cache: {info.hits} hits, {info.misses} misses ({hit_rate:.1%} hit rate), "
+            f"{info.currsize}/{info.maxsize} entries")
+
+
+def verify_against_headings(path=HEADINGS_PATH):
+    """
+    Tokenizes every heading with both tokenizers and checks that the outputs match.
+
+    Returns:
+        bool: True if every heading gives the same tokens.
+    """
+    import csv
+    with open(path, encoding="utf-8") as f:
+        headings = [row["Heading"] for row in csv.DictReader(f)]
+
+    start = time.perf_counter()
+    expected = [reference_tokenizer(heading) for heading in headings]
+    reference_time = time.perf_counter() - start
+
+    _stem.cache_clear()
+    start = time.perf_counter()
+    actual = [custom_tokenizer(heading) for heading in headings]
+    fast_time = time.perf_counter() - start
+
+    mismatches = [heading for heading, a, b in zip(headings, expected, actual) if a != b]
+    for heading in mismatches[:10]:
+        print(f"Mismatch: {heading!r}")
+    print(f"{len(headings)} headings, {len(mismatches)} mismatches")
+    print(f"Reference tokenizer: {reference_time:.3f} s, fast tokenizer: {fast_time:.3f} s "
+          f"({reference_time / fast_time:.1f}x)")
+    print(stem_cache_report())
+    return not mismatches
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_against_headings(*sys.argv[1:2]) else 1)